@@ -0,0 +1,276 @@
+"""Admission control: per-client rate limits, per-route concurrency and load shedding.
+
+Every request is classified by method and path (``ROUTE_CLASSES``) and goes
+through three gates, cheapest first. Admin-only routes get the ``admin`` class
+when the request carries credentials, so bulk imports and catalog edits are
+not throttled like anonymous browsing; the route still checks the token.
+
+1. A token bucket per (class, client IP). Over the limit answers 429 with
+   ``Retry-After``. Buckets live in a pluggable store: in process memory by
+   default, or in MongoDB (``RATE_LIMIT_STORE=mongo``) so every worker
+   shares them.
+2. Load shedding. Once in-flight requests reach ``capacity - reserve``, only
+   priority classes (checkout, checkout status, Stripe webhooks) are admitted,
+   so browsing traffic is shed with 503 before paying customers notice.
+3. A per-class concurrency limit with a bounded wait queue. A request that
+   finds the queue full, or waits longer than the class's queue timeout, gets
+   503 right away instead of piling onto MongoDB and Stripe.
+
+Concurrency limits are per worker; with N workers the effective limit is N
+times the configured value.
+"""
+import asyncio
+import importlib
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+
+from metrics import admission_rejections
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Policy:
+    concurrency: int = 0  # 0 means unlimited
+    queue: int = 0
+    queue_timeout: float = 1.0
+    rate: float = 0.0  # tokens per second per client; 0 means no rate limit
+    burst: int = 0
+    priority: bool = False
+
+
+# First match wins; None matches any method
+ROUTE_CLASSES = [
+    (None, re.compile(r"^/api/(health|metrics)?/?$"), "exempt"),
+    ("POST", re.compile(r"^/api/webhook/stripe$"), "webhook"),
+    ("POST", re.compile(r"^/api/checkout$"), "checkout"),
+    ("GET", re.compile(r"^/api/checkout/status/[^/]+$"), "checkout_status"),
+    ("POST", re.compile(r"^/api/admin/login$"), "login"),
+    (None, re.compile(r"^/api/admin/"), "admin"),
+    (None, re.compile(r"^/api/products/(import|export|[^/]+/inventory)$"), "admin"),
+    ("GET", re.compile(r"^/api/orders(/export)?$"), "admin"),
+    ("PUT", re.compile(r"^/api/orders/[^/]+/status$"), "admin"),
+    ("POST", re.compile(r"^/api/(products|lookbook|videos)$"), "admin"),
+    ("PUT", re.compile(r"^/api/(products|lookbook|videos)/[^/]+$"), "admin"),
+    ("DELETE", re.compile(r"^/api/(products|lookbook|videos)/[^/]+$"), "admin"),
+    ("GET", re.compile(r"^/api/orders/(?!export$)[^/]+$"), "order_lookup"),
+    (None, re.compile(r"^/api/uploads/"), "media"),
+    ("POST", re.compile(r"^/api/upload/"), "upload"),
+    ("GET", re.compile(r"^/api/(products|storefront|categories|lookbook|videos|images)(/|$)"), "browse"),
+]
+
+DEFAULT_POLICIES: Dict[str, Policy] = {
+    "exempt": Policy(),
+    # Stripe delivers from a few shared IPs, so webhooks are not rate limited per client
+    "webhook": Policy(concurrency=64, queue=512, queue_timeout=10.0, priority=True),
+    "checkout": Policy(concurrency=32, queue=256, queue_timeout=5.0, rate=1.0, burst=10, priority=True),
+    "checkout_status": Policy(concurrency=64, queue=256, queue_timeout=2.0, rate=5.0, burst=20, priority=True),
+    "login": Policy(concurrency=8, queue=16, queue_timeout=2.0, rate=5 / 60, burst=5),
+    "admin": Policy(concurrency=32, queue=128, queue_timeout=30.0, rate=200.0, burst=1000),
+    "order_lookup": Policy(concurrency=16, queue=32, queue_timeout=1.0, rate=0.5, burst=10),
+    "media": Policy(concurrency=256, queue=512, queue_timeout=2.0, rate=50.0, burst=200),
+    "upload": Policy(concurrency=4, queue=8, queue_timeout=30.0),
+    "browse": Policy(concurrency=128, queue=256, queue_timeout=0.5, rate=20.0, burst=60),
+    "default": Policy(concurrency=64, queue=128, queue_timeout=1.0, rate=20.0, burst=60),
+}
+
+
+def classify(method: str, path: str, authenticated: bool = False) -> str:
+    for rule_method, pattern, name in ROUTE_CLASSES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            if name == "admin" and not authenticated:
+                return "default"
+            return name
+    return "default"
+
+
+class MemoryRateLimitStore:
+    """Token buckets in this process only, bounded to ``max_keys`` clients"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Spend one token; returns 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class MongoRateLimitStore:
+    """Token buckets shared by all workers, refilled atomically in one update using the server clock"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]},
+                    "updated_at": "$$NOW",
+                }},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return 0.0 if doc["allowed"] else (1 - doc["tokens"]) / rate
+
+
+def create_rate_limit_store(db):
+    """Build the token bucket store configured by RATE_LIMIT_STORE (memory, mongo or module:Class)"""
+    store = os.environ.get("RATE_LIMIT_STORE", "memory")
+    if store == "memory":
+        return MemoryRateLimitStore()
+    if store == "mongo":
+        return MongoRateLimitStore(db.rate_limits)
+    module_name, _, class_name = store.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class Bulkhead:
+    def __init__(self, limit: int, queue: int, timeout: float):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return True
+        if self.waiting >= self.queue:
+            return False
+        self.waiting += 1
+        acquired = False
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self._semaphore.acquire()
+                acquired = True
+        except BaseException as e:
+            # A timeout or disconnect that lands once the permit is won must not keep it
+            if acquired:
+                self._semaphore.release()
+            if isinstance(e, TimeoutError):
+                return False
+            raise
+        finally:
+            self.waiting -= 1
+        return True
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app,
+        store=None,
+        policies: Optional[Dict[str, Policy]] = None,
+        capacity: int = 512,
+        reserve: float = 0.2,
+        forwarded_hops: int = 1,
+    ):
+        self.app = app
+        self.store = store or MemoryRateLimitStore()
+        self.policies = policies or DEFAULT_POLICIES
+        self.capacity = capacity
+        self.shed_at = capacity - math.ceil(capacity * reserve)
+        self.forwarded_hops = forwarded_hops
+        self.in_flight = 0
+        self.bulkheads = {
+            name: Bulkhead(p.concurrency, p.queue, p.queue_timeout)
+            for name, p in self.policies.items() if p.concurrency
+        }
+
+    def client_ip(self, scope) -> str:
+        # Behind N proxies that each append to X-Forwarded-For, the Nth entry from the right is the real client
+        if self.forwarded_hops:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    hops = [h.strip() for h in value.decode("latin-1").split(",") if h.strip()]
+                    if hops:
+                        return hops[-min(self.forwarded_hops, len(hops))]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    def has_credentials(scope) -> bool:
+        return any(name == b"authorization" and value for name, value in scope.get("headers", []))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        name = classify(scope["method"], scope["path"], self.has_credentials(scope))
+        policy = self.policies.get(name) or self.policies["default"]
+        if name == "exempt":
+            await self.app(scope, receive, send)
+            return
+
+        if policy.rate:
+            try:
+                wait = await self.store.take(f"{name}:{self.client_ip(scope)}", policy.rate, policy.burst)
+            except Exception as e:
+                # Fail open: a broken shared store must not take the storefront down with it
+                logger.error(f"Rate limit store failed: {e}")
+                wait = 0.0
+            if wait:
+                await self.reject(send, name, 429, "rate_limited", "Too many requests", math.ceil(wait))
+                return
+
+        if not policy.priority and self.in_flight >= self.shed_at:
+            await self.reject(send, name, 503, "shed", "Server busy, please retry", 1)
+            return
+
+        bulkhead = self.bulkheads.get(name)
+        if bulkhead is not None and not await bulkhead.acquire():
+            await self.reject(send, name, 503, "queue_full", "Server busy, please retry", 1)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            if bulkhead is not None:
+                bulkhead.release()
+
+    @staticmethod
+    async def reject(send, name: str, status: int, reason: str, detail: str, retry_after: int) -> None:
+        admission_rejections.inc(route_class=name, reason=reason)
+        body = json.dumps({"detail": detail}).encode()
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, retry_after)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,169 @@
+"""Incrementally maintained sales rollups.
+
+Each paid order adds its revenue and units to one ``sales_rollups`` document
+per (day, dimension, key), where dimension is ``total``, ``product``,
+``category`` or ``size``. Reads for a date range therefore touch O(days x keys)
+small documents instead of scanning orders. ``rebuild_rollups`` recomputes the
+whole collection from paid orders with an aggregation pipeline and swaps it in,
+which also repairs any drift (e.g. a crash between marking an order paid and
+recording its sales). Run it by hand with ``python analytics.py rebuild``.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS = "sales_rollups"
+DIMENSIONS = ("total", "product", "category", "size")
+
+
+def day_of(value) -> str:
+    if not isinstance(value, datetime):
+        value = datetime.now(timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%d")
+
+
+async def record_sales(db, orders: List[Dict]) -> None:
+    """Add newly paid orders to the rollups with one bulk write"""
+    if not orders:
+        return
+    product_ids = list({item["product_id"] for order in orders for item in order.get("items", [])})
+    products = await db.products.find({"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "category": 1}).to_list(len(product_ids))
+    categories = {p["id"]: p.get("category", "unknown") for p in products}
+
+    increments: Dict[tuple, Dict[str, float]] = defaultdict(lambda: {"revenue": 0.0, "units": 0, "orders": 0})
+    for order in orders:
+        day = day_of(order.get("paid_at") or order.get("created_at"))
+        total = increments[(day, "total", "all")]
+        total["revenue"] += order.get("total", 0)
+        total["orders"] += 1
+        touched = set()
+        for item in order.get("items", []):
+            revenue = item["price"] * item["quantity"]
+            total["units"] += item["quantity"]
+            for dimension, key in (
+                ("product", item["product_id"]),
+                ("category", categories.get(item["product_id"], "unknown")),
+                ("size", item.get("size", "")),
+            ):
+                bucket = increments[(day, dimension, key)]
+                bucket["revenue"] += revenue
+                bucket["units"] += item["quantity"]
+                touched.add((day, dimension, key))
+        # Two lines of one order (e.g. two sizes of a product) still count as one order per key
+        for key in touched:
+            increments[key]["orders"] += 1
+
+    await db[ROLLUPS].bulk_write([
+        UpdateOne({"day": day, "dimension": dimension, "key": key}, {"$inc": values}, upsert=True)
+        for (day, dimension, key), values in increments.items()
+    ], ordered=False)
+
+
+async def query_rollups(db, dimension: str, start: str, end: str) -> Dict:
+    docs = await db[ROLLUPS].find(
+        {"dimension": dimension, "day": {"$gte": start, "$lte": end}},
+        {"_id": 0, "dimension": 0}
+    ).sort([("day", ASCENDING), ("key", ASCENDING)]).to_list(None)
+
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: {"revenue": 0.0, "units": 0, "orders": 0})
+    for doc in docs:
+        for field in ("revenue", "units", "orders"):
+            totals[doc["key"]][field] += doc.get(field, 0)
+    return {
+        "dimension": dimension,
+        "start": start,
+        "end": end,
+        "days": docs,
+        "totals": sorted(({"key": k, **v} for k, v in totals.items()), key=lambda t: t["revenue"], reverse=True),
+    }
+
+
+def _rollup_pipelines() -> Dict[str, List[Dict]]:
+    paid = [
+        {"$match": {"payment_status": "paid"}},
+        {"$set": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": {"$ifNull": ["$paid_at", "$created_at"]}}}}},
+    ]
+    lines = paid + [
+        {"$unwind": "$items"},
+        {"$set": {"line_revenue": {"$multiply": ["$items.price", "$items.quantity"]}}},
+    ]
+
+    def by(key_expr, prefix):
+        return prefix + [
+            {"$group": {
+                "_id": {"day": "$day", "key": key_expr},
+                "revenue": {"$sum": "$line_revenue"},
+                "units": {"$sum": "$items.quantity"},
+                "order_ids": {"$addToSet": "$id"},
+            }},
+            {"$set": {"orders": {"$size": "$order_ids"}}},
+        ]
+
+    category_lines = lines + [
+        {"$lookup": {"from": "products", "localField": "items.product_id", "foreignField": "id", "as": "product"}},
+        {"$set": {"category": {"$ifNull": [{"$arrayElemAt": ["$product.category", 0]}, "unknown"]}}},
+    ]
+    return {
+        "total": paid + [
+            {"$group": {
+                "_id": {"day": "$day", "key": "all"},
+                "revenue": {"$sum": "$total"},
+                "units": {"$sum": {"$sum": "$items.quantity"}},
+                "orders": {"$sum": 1},
+            }},
+        ],
+        "product": by("$items.product_id", lines),
+        "category": by("$category", category_lines),
+        "size": by("$items.size", lines),
+    }
+
+
+async def rebuild_rollups(db) -> int:
+    """Recompute every rollup from paid orders and atomically replace the collection"""
+    staging = f"{ROLLUPS}_rebuild"
+    await db[staging].drop()
+    await db[staging].create_index(
+        [("dimension", ASCENDING), ("day", ASCENDING), ("key", ASCENDING)],
+        name="dimension_day_key_unique", unique=True
+    )
+
+    pipelines = _rollup_pipelines()
+    pipeline = []
+    for dimension in DIMENSIONS:
+        stages = pipelines[dimension] + [{"$project": {
+            "_id": 0, "day": "$_id.day", "dimension": {"$literal": dimension}, "key": "$_id.key",
+            "revenue": 1, "units": 1, "orders": 1,
+        }}]
+        if not pipeline:
+            pipeline = stages
+        else:
+            pipeline.append({"$unionWith": {"coll": "orders", "pipeline": stages}})
+    pipeline.append({"$out": staging})
+
+    await db.orders.aggregate(pipeline).to_list(None)
+    count = await db[staging].count_documents({})
+    await db[staging].rename(ROLLUPS, dropTarget=True)
+    logger.info(f"Rebuilt {count} sales rollup documents")
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python analytics.py rebuild")
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    asyncio.run(rebuild_rollups(client[os.environ['DB_NAME']]))
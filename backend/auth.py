@@ -0,0 +1,178 @@
+"""Admin accounts and token verification.
+
+Admin users live in ``admin_users`` with bcrypt password hashes. bcrypt is
+deliberately slow (~250 ms at the default cost), so checks run in the thread
+pool and never stall the event loop; unknown usernames are checked against a
+dummy hash so both failures take the same time.
+
+Issued JWTs carry a ``jti``. Verified tokens are kept in a bounded LRU cache
+until their ``exp``, so admin tooling firing hundreds of calls with one token
+does not re-verify the signature each time. Logging out records the ``jti`` in
+``revoked_tokens`` (expired by a TTL index); cached entries re-check that
+collection every ``TOKEN_RECHECK_SECONDS``, which bounds how long another
+worker can keep honouring a revoked token.
+
+On first boot with no admin users, ``ensure_admin_user`` creates one from
+``ADMIN_USERNAME``/``ADMIN_PASSWORD``. Add more with
+``python auth.py create-user <username>``.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+import bcrypt
+import jwt
+from fastapi.concurrency import run_in_threadpool
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+TOKEN_TTL = 86400  # 24 hours
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS)).decode()
+
+
+class TokenCache:
+    """LRU of verified token payloads, each dropped at its ``exp``"""
+
+    def __init__(self, max_entries: int = 1024, recheck: float = 30.0):
+        self.max_entries = max_entries
+        self.recheck = recheck
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[tuple]:
+        """Returns ``(payload, needs_recheck)`` for a cached, unexpired token"""
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        payload, checked_at = entry
+        if payload.get("exp", 0) <= time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return payload, time.monotonic() - checked_at > self.recheck
+
+    def put(self, token: str, payload: Dict) -> None:
+        self._entries[token] = (payload, time.monotonic())
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def revoke(self, jti: str) -> None:
+        for token in [t for t, (payload, _) in self._entries.items() if payload.get("jti") == jti]:
+            del self._entries[token]
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class AdminAuth:
+    def __init__(self, db, secret: str, cache: Optional[TokenCache] = None):
+        self.users = db.admin_users
+        self.revoked = db.revoked_tokens
+        self.secret = secret
+        self.cache = cache or TokenCache(
+            max_entries=int(os.environ.get("TOKEN_CACHE_SIZE", "1024")),
+            recheck=float(os.environ.get("TOKEN_RECHECK_SECONDS", "30")),
+        )
+        self._dummy_hash: Optional[bytes] = None
+
+    async def authenticate(self, username: str, password: str) -> Optional[Dict]:
+        user = await self.users.find_one(
+            {"username": username, "active": {"$ne": False}},
+            {"_id": 0, "username": 1, "password_hash": 1}
+        )
+        if user is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = (await run_in_threadpool(hash_password, uuid.uuid4().hex)).encode()
+            await run_in_threadpool(bcrypt.checkpw, password.encode(), self._dummy_hash)
+            return None
+        if not await run_in_threadpool(bcrypt.checkpw, password.encode(), user["password_hash"].encode()):
+            return None
+        return user
+
+    def create_token(self, username: str) -> str:
+        payload = {
+            "username": username,
+            "jti": uuid.uuid4().hex,
+            "exp": datetime.now(timezone.utc).timestamp() + TOKEN_TTL
+        }
+        return jwt.encode(payload, self.secret, algorithm="HS256")
+
+    async def verify(self, token: str) -> Dict:
+        """Decoded payload of a valid, unrevoked token; raises jwt errors or InvalidToken"""
+        cached = self.cache.get(token)
+        if cached is not None and not cached[1]:
+            return cached[0]
+        payload = cached[0] if cached is not None else jwt.decode(token, self.secret, algorithms=["HS256"])
+        if payload.get("jti") and await self.revoked.find_one({"jti": payload["jti"]}, {"_id": 1}):
+            self.cache.revoke(payload["jti"])
+            raise InvalidToken("Token revoked")
+        self.cache.put(token, payload)
+        return payload
+
+    async def revoke(self, payload: Dict) -> None:
+        jti = payload.get("jti")
+        if not jti:
+            return
+        self.cache.revoke(jti)
+        try:
+            await self.revoked.insert_one({
+                "jti": jti,
+                "expires_at": datetime.fromtimestamp(payload.get("exp", time.time() + TOKEN_TTL), timezone.utc)
+            })
+        except DuplicateKeyError:
+            pass
+
+    async def create_user(self, username: str, password: str) -> None:
+        await self.users.insert_one({
+            "id": str(uuid.uuid4()),
+            "username": username,
+            "password_hash": await run_in_threadpool(hash_password, password),
+            "active": True,
+            "created_at": datetime.now(timezone.utc)
+        })
+
+    async def ensure_admin_user(self) -> None:
+        if await self.users.count_documents({}, limit=1):
+            return
+        username = os.environ.get("ADMIN_USERNAME", "admin")
+        password = os.environ.get("ADMIN_PASSWORD")
+        if not password:
+            password = "admin123"
+            logger.warning("Seeding the admin user with the default password; set ADMIN_PASSWORD or change it")
+        try:
+            await self.create_user(username, password)
+            logger.info(f"Created admin user {username}")
+        except DuplicateKeyError:
+            # Another worker seeded it first
+            pass
+
+
+if __name__ == "__main__":
+    import getpass
+    import sys
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    if len(sys.argv) != 3 or sys.argv[1] != "create-user":
+        sys.exit("usage: python auth.py create-user <username>")
+    load_dotenv(Path(__file__).parent / '.env')
+    password = getpass.getpass("Password: ")
+    if password != getpass.getpass("Repeat password: "):
+        sys.exit("Passwords do not match")
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    auth = AdminAuth(client[os.environ['DB_NAME']], os.environ.get('JWT_SECRET', ''))
+    asyncio.run(auth.create_user(sys.argv[2], password))
+    print(f"Created admin user {sys.argv[2]}")
@@ -0,0 +1,119 @@
+"""Limited-drop contention check for checkout stock reservations.
+
+Seeds one product with ``--stock`` units of a single size, then fires
+``--buyers`` concurrent checkouts for it through the API (fake Stripe client,
+throwaway database, as in ``benchmarks.run``). Verifies that exactly
+``--stock`` checkouts succeed, every other buyer gets a 409 (or a 503 when
+admission control sheds them), and the inventory
+counters add up with nothing oversold. Then pays half of the sessions and
+expires the rest, and checks that paid holds become sales and expired ones
+return to stock. Reports checkout throughput and latency.
+
+The same invariants are asserted against ``inventory`` directly in
+``tests/test_inventory.py``; this script exercises them through the full
+HTTP stack under load.
+
+Run from ``backend/``::
+
+    python -m benchmarks.drop --stock 50 --buyers 500
+
+Exits non-zero if any invariant is violated.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.run import percentile  # noqa: E402
+
+
+async def main(args) -> int:
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = f"bench_drop_{uuid.uuid4().hex[:8]}"
+    os.environ["PAYMENT_CLIENT"] = "benchmarks.fakes:FakePaymentClient"
+    os.environ.setdefault("FAKE_STRIPE_LATENCY", str(args.stripe_latency))
+
+    import httpx
+    import inventory
+    import server
+
+    app = server.create_app()
+    resources = app.state.resources
+    db = resources.db
+    product = server.Product(name="Drop Hoodie", description="Limited", price=120.0, category="hoodies", image_url="/x.jpg")
+    await db.products.insert_one(product.model_dump())
+    await inventory.set_stock(db, product.id, [{"size": "M", "available": args.stock}])
+
+    failures = []
+
+    def check(condition: bool, message: str) -> None:
+        print(f"{'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                latencies = []
+
+                async def buy(i: int):
+                    started = time.perf_counter()
+                    response = await client.post("/api/checkout", json={
+                        "items": [{"product_id": product.id, "name": product.name, "price": 0, "quantity": 1, "size": "M"}],
+                        "origin_url": "http://bench.local",
+                    }, headers={"X-Forwarded-For": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"})
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    return response
+
+                started = time.perf_counter()
+                responses = await asyncio.gather(*[buy(i) for i in range(args.buyers)])
+                elapsed = time.perf_counter() - started
+
+        ok = [r for r in responses if r.status_code == 200]
+        sold_out = [r for r in responses if r.status_code == 409]
+        shed = [r for r in responses if r.status_code == 503]
+        print(f"{args.buyers} checkouts in {elapsed:.2f}s: {args.buyers / elapsed:.0f}/s, "
+              f"p50 {percentile(latencies, 0.5):.1f} ms, p99 {percentile(latencies, 0.99):.1f} ms")
+        check(len(ok) == min(args.stock, args.buyers - len(shed)), f"{len(ok)} checkouts succeeded for {args.stock} units")
+        check(len(ok) + len(sold_out) + len(shed) == args.buyers,
+              f"{len(sold_out)} buyers got 409, {len(shed)} were shed by admission control, no other errors")
+
+        level = (await inventory.stock_levels(db, product.id))[0]
+        check(level["available"] >= 0, f"available never negative ({level['available']})")
+        check(level["available"] + level["reserved"] + level["sold"] == args.stock,
+              f"available {level['available']} + reserved {level['reserved']} + sold {level['sold']} == {args.stock}")
+
+        # Pay half the sessions, let the rest lapse
+        sessions = [r.json()["session_id"] for r in ok]
+        paid, abandoned = sessions[::2], sessions[1::2]
+        await server.mark_sessions_paid(resources, paid)
+        await db.reservations.update_many({}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+        await inventory.release_expired(db)
+
+        level = (await inventory.stock_levels(db, product.id))[0]
+        check(level["sold"] == len(paid), f"sold {level['sold']} == paid {len(paid)}")
+        check(level["reserved"] == 0, f"no units left reserved ({level['reserved']})")
+        check(level["available"] == args.stock - len(paid), f"abandoned {len(abandoned)} units returned to stock")
+    finally:
+        await db.client.drop_database(os.environ["DB_NAME"])
+
+    return 1 if failures else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stock", type=int, default=50, help="units available in the drop")
+    parser.add_argument("--buyers", type=int, default=500, help="concurrent checkouts")
+    parser.add_argument("--stripe-latency", type=float, default=0.05, help="fake Stripe round trip, seconds")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
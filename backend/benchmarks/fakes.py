@@ -0,0 +1,100 @@
+"""Local stand-ins used by the benchmarks.
+
+``FakePaymentClient`` implements the same interface as
+``payments.StripePaymentClient`` entirely in memory, with a configurable
+per-call delay (``FAKE_STRIPE_LATENCY`` seconds) standing in for the round trip
+to Stripe. Load it with ``PAYMENT_CLIENT=benchmarks.fakes:FakePaymentClient``.
+"""
+import asyncio
+import json
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+@dataclass
+class FakeCheckoutSession:
+    url: str
+    session_id: str
+
+
+@dataclass
+class FakeCheckoutStatus:
+    status: str
+    payment_status: str
+    amount_total: int
+    currency: str
+    metadata: Dict = field(default_factory=dict)
+
+
+@dataclass
+class FakeWebhookEvent:
+    event_type: str
+    event_id: str
+    session_id: str
+    payment_status: str
+    metadata: Dict = field(default_factory=dict)
+
+
+class FakePaymentClient:
+    def __init__(self, latency: Optional[float] = None, **settings):
+        self.latency = float(os.environ.get("FAKE_STRIPE_LATENCY", "0.05")) if latency is None else latency
+        self.sessions: Dict[str, FakeCheckoutStatus] = {}
+        self.calls = 0
+
+    async def _round_trip(self) -> None:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def create_checkout_session(self, checkout_request: dict, base_url: str) -> FakeCheckoutSession:
+        await self._round_trip()
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        self.sessions[session_id] = FakeCheckoutStatus(
+            status="open",
+            payment_status="unpaid",
+            amount_total=round(checkout_request["amount"] * 100),
+            currency=checkout_request["currency"],
+            metadata=dict(checkout_request.get("metadata") or {}),
+        )
+        return FakeCheckoutSession(url=f"https://checkout.stripe.test/pay/{session_id}", session_id=session_id)
+
+    async def get_checkout_status(self, session_id: str, base_url: str) -> FakeCheckoutStatus:
+        await self._round_trip()
+        status = self.sessions.get(session_id)
+        if status is None:
+            raise ValueError(f"No such checkout session: {session_id}")
+        return status
+
+    async def handle_webhook(self, body: bytes, signature: str, base_url: str) -> FakeWebhookEvent:
+        # Signatures are not checked; the body is a Stripe-shaped event
+        event = json.loads(body)
+        session = event["data"]["object"]
+        if session.get("payment_status") == "paid":
+            self.pay(session["id"])
+        return FakeWebhookEvent(
+            event_type=event.get("type", ""),
+            event_id=event["id"],
+            session_id=session["id"],
+            payment_status=session.get("payment_status", ""),
+            metadata=session.get("metadata", {}),
+        )
+
+    def pay(self, session_id: str) -> None:
+        """Simulate the customer completing payment on Stripe's hosted page"""
+        status = self.sessions.get(session_id)
+        if status is not None:
+            status.status = "complete"
+            status.payment_status = "paid"
+
+    async def close(self) -> None:
+        pass
+
+
+def webhook_event(session_id: str, payment_status: str = "paid", event_id: Optional[str] = None) -> bytes:
+    return json.dumps({
+        "id": event_id or f"evt_{uuid.uuid4().hex}",
+        "type": "checkout.session.completed",
+        "data": {"object": {"id": session_id, "payment_status": payment_status, "metadata": {}}},
+    }).encode()
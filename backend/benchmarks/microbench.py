@@ -0,0 +1,86 @@
+"""CPU micro-benchmarks for hot in-process paths (no database needed).
+
+Run from ``backend/``::
+
+    python -m benchmarks.microbench --products 1000 --rounds 50
+
+Reports, per 1000 products, the cost of the old list serialization (validate
+each document through ``Product`` then encode with FastAPI's default JSON
+path) versus the trusted-document + orjson path, and search index latency.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from search_index import ProductSearchIndex  # noqa: E402
+from serialization import dumps, trusted_documents  # noqa: E402
+from server import Product  # noqa: E402
+
+WORDS = "brooklyn classic heavyweight vintage wash garment gallery logo embroidered fleece crewneck boxy cropped".split()
+
+
+def make_products(n: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [{
+        "id": str(uuid.uuid4()),
+        "name": " ".join(random.sample(WORDS, 3)).title(),
+        "description": " ".join(random.sample(WORDS, 12)),
+        "price": round(random.uniform(20, 250), 2),
+        "category": random.choice(["tees", "hoodies", "sweats", "hats", "accessories"]),
+        "image_url": f"/api/uploads/images/{uuid.uuid4()}.jpg",
+        "colors": random.sample(["Black", "White", "Red", "Olive", "Navy"], 2),
+        "created_at": now - timedelta(minutes=i),
+    } for i in range(n)]
+
+
+def timeit(fn, rounds: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    docs = make_products(args.products)
+    scale = 1000 / args.products
+
+    def validated():
+        models = [Product(**d) for d in docs]
+        JSONResponse(jsonable_encoder(models)).body
+
+    def trusted():
+        dumps(trusted_documents(Product, docs))
+
+    print(f"serialization per 1000 products, pydantic + stdlib json: {timeit(validated, args.rounds) * scale:.2f} ms")
+    print(f"serialization per 1000 products, trusted + fast encoder: {timeit(trusted, args.rounds) * scale:.2f} ms")
+
+    index = ProductSearchIndex()
+    started = time.perf_counter()
+    index.build(docs)
+    print(f"search index build for {args.products} products: {(time.perf_counter() - started) * 1000:.1f} ms")
+    for query in ["", "vint", "brooklyn fleece", "zzz"]:
+        print(f"search {query!r}: {timeit(lambda: index.search(query), args.rounds):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Load and latency benchmark for the API.
+
+Builds the app with ``server.create_app()`` and boots it in-process against MongoDB (``MONGO_URL``, default a local
+mongod, or an in-memory mongomock-motor client with ``--in-memory``) in a
+throwaway database, with the in-memory fake Stripe client from
+``benchmarks.fakes``. A synthetic catalog is seeded, then ``--concurrency``
+workers drive a weighted mix of storefront and admin traffic for
+``--duration`` seconds and per-route p50/p95/p99 latency and throughput are
+reported.
+
+Run from ``backend/``::
+
+    python -m benchmarks.run --duration 30 --concurrency 50
+    python -m benchmarks.run --mix browse=60,detail=30,checkout=10
+    python -m benchmarks.run --http                      # through uvicorn over loopback
+    python -m benchmarks.run --in-memory                 # no mongod needed; not comparable to real runs
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --tolerance 0.25
+    python -m benchmarks.run --cart-sweep 1,5,10,25      # checkout latency vs cart size
+
+``--compare`` exits non-zero when any route's p95 regresses past the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_MIX = "home=5,browse=30,detail=25,search=10,checkout=10,status=12,webhook=6,upload=2"
+CATEGORIES = ["tees", "hoodies", "sweats", "hats", "accessories"]
+COLORS = ["Black", "White", "Red", "Olive", "Navy", "Grey", "Cream"]
+WORDS = "brooklyn classic heavyweight vintage wash garment gallery logo embroidered fleece crewneck boxy cropped".split()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, started: float, ok: bool) -> None:
+        self.latencies[route].append((time.perf_counter() - started) * 1000)
+        if not ok:
+            self.errors[route] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict]:
+        return {
+            route: {
+                "count": len(values),
+                "rps": round(len(values) / elapsed, 1),
+                "p50": round(percentile(values, 0.50), 2),
+                "p95": round(percentile(values, 0.95), 2),
+                "p99": round(percentile(values, 0.99), 2),
+                "errors": self.errors[route],
+            }
+            for route, values in sorted(self.latencies.items())
+        }
+
+
+def print_summary(summary: Dict[str, Dict]) -> None:
+    print(f"{'route':<36}{'count':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for route, row in summary.items():
+        print(f"{route:<36}{row['count']:>8}{row['rps']:>9}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}{row['errors']:>8}")
+
+
+def compare(summary: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    regressions = []
+    for route, base in baseline.items():
+        current = summary.get(route)
+        if current is None or not base.get("p95"):
+            continue
+        if current["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {current['p95']} ms vs baseline {base['p95']} ms")
+    return regressions
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Workload:
+    def __init__(self, server, resources, client, stats: Stats, upload_size: int, clients: int = 1):
+        self.server = server
+        self.resources = resources
+        self.client = client
+        self.stats = stats
+        # Distinct client addresses, so per-IP rate limits see many shoppers rather than one
+        self.client_ips = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(max(1, clients))]
+        self.upload_size = upload_size
+        self.product_ids: List[str] = []
+        self.sessions: List[str] = []
+        self.uploads: List[str] = []
+        self.auth = {"Authorization": f"Bearer {resources.admin_auth.create_token('admin')}"}
+
+    async def seed(self, products: int) -> None:
+        now = datetime.now(timezone.utc)
+        docs = []
+        for i in range(products):
+            doc = self.server.Product(
+                name=" ".join(random.sample(WORDS, 3)).title(),
+                description=" ".join(random.sample(WORDS, 10)),
+                price=round(random.uniform(20, 250), 2),
+                category=random.choice(CATEGORIES),
+                image_url=f"/api/uploads/images/{uuid.uuid4()}.jpg",
+                colors=random.sample(COLORS, 2),
+                featured=random.random() < 0.1,
+                new_arrival=random.random() < 0.15,
+                created_at=now - timedelta(minutes=i),
+            ).model_dump()
+            docs.append(doc)
+        await self.resources.db.products.insert_many(docs)
+        await self.resources.db.lookbook.insert_many([
+            self.server.LookbookItem(title=f"Look {i}", image_url=f"/api/uploads/images/{uuid.uuid4()}.jpg").model_dump()
+            for i in range(20)
+        ])
+        await self.resources.db.videos.insert_many([
+            self.server.Video(title=f"Drop {i}", video_url=f"/api/uploads/videos/{uuid.uuid4()}.mp4").model_dump()
+            for i in range(5)
+        ])
+        self.product_ids = [d["id"] for d in docs]
+
+    async def call(self, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            headers = {"X-Forwarded-For": random.choice(self.client_ips), **kwargs.pop("headers", {})}
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except Exception:
+            self.stats.record(route, started, False)
+            return None
+        self.stats.record(route, started, response.status_code < 500 and response.status_code != 429)
+        return response
+
+    async def home(self):
+        await self.call("GET /api/storefront", "GET", "/api/storefront")
+
+    async def browse(self):
+        params = random.choice([{}, {"featured": "true"}, {"new_arrival": "true"}, {"category": random.choice(CATEGORIES)}])
+        await self.call("GET /api/products", "GET", "/api/products", params=params)
+
+    async def detail(self):
+        await self.call("GET /api/products/{id}", "GET", f"/api/products/{random.choice(self.product_ids)}")
+
+    async def search(self):
+        params = {"q": random.choice(WORDS)[:random.randint(3, 8)]}
+        if random.random() < 0.3:
+            params["category"] = random.choice(CATEGORIES)
+        await self.call("GET /api/products/search", "GET", "/api/products/search", params=params)
+
+    async def checkout(self, cart_size: int = 0, route: str = "POST /api/checkout"):
+        items = [
+            {"product_id": pid, "name": "bench", "price": 0, "quantity": random.randint(1, 2), "size": "M"}
+            for pid in random.sample(self.product_ids, cart_size or random.randint(1, 5))
+        ]
+        response = await self.call(route, "POST", "/api/checkout", json={"items": items, "origin_url": "http://bench.local"})
+        if response is not None and response.status_code == 200:
+            session_id = response.json()["session_id"]
+            self.sessions.append(session_id)
+            # Roughly half of shoppers complete payment
+            if random.random() < 0.5:
+                self.resources.get_payment_client().pay(session_id)
+
+    async def status(self):
+        if self.sessions:
+            session_id = random.choice(self.sessions[-200:])
+            await self.call("GET /api/checkout/status/{id}", "GET", f"/api/checkout/status/{session_id}")
+
+    async def webhook(self):
+        from benchmarks.fakes import webhook_event
+
+        if not self.sessions:
+            return
+        # Bursts: several events at once, some of them replays
+        burst = random.sample(self.sessions[-200:], min(len(self.sessions), 5))
+        events = [webhook_event(session_id, event_id=f"evt_bench_{session_id}") for session_id in burst]
+        await asyncio.gather(*[
+            self.call("POST /api/webhook/stripe", "POST", "/api/webhook/stripe", content=body)
+            for body in events
+        ])
+
+    async def upload(self):
+        data = os.urandom(self.upload_size)
+        response = await self.call(
+            "POST /api/upload/video", "POST", "/api/upload/video",
+            files={"file": ("bench.mp4", data, "video/mp4")}, headers=self.auth
+        )
+        if response is not None and response.status_code == 200:
+            self.uploads.append(response.json()["key"])
+
+    async def cleanup_uploads(self) -> None:
+        for key in self.uploads:
+            await self.resources.storage.delete(key)
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+async def drive(workload: Workload, mix: Dict[str, int], duration: float, concurrency: int) -> float:
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await getattr(workload, random.choices(names, weights)[0])()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return time.perf_counter() - started
+
+
+async def cart_sweep(workload: Workload, sizes: List[int], repeats: int) -> None:
+    for size in sizes:
+        for _ in range(repeats):
+            await workload.checkout(cart_size=size, route=f"checkout cart={size}")
+
+
+async def main(args) -> int:
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = args.db_name or f"bench_{uuid.uuid4().hex[:8]}"
+    os.environ["PAYMENT_CLIENT"] = "benchmarks.fakes:FakePaymentClient"
+    os.environ.setdefault("FAKE_STRIPE_LATENCY", str(args.stripe_latency))
+
+    import httpx
+    import server
+
+    client = None
+    if args.in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+
+        client = AsyncMongoMockClient(tz_aware=True)
+    app = server.create_app(client=client)
+    resources = app.state.resources
+    random.seed(args.seed)
+    stats = Stats()
+    await resources.client.drop_database(os.environ["DB_NAME"])
+
+    async def run(client) -> float:
+        workload = Workload(server, resources, client, stats, args.upload_size, args.clients)
+        workload.product_ids = [p["id"] for p in await resources.db.products.find({}, {"_id": 0, "id": 1}).to_list(None)]
+        try:
+            if args.cart_sweep:
+                sizes = [int(s) for s in args.cart_sweep.split(",")]
+                started = time.perf_counter()
+                await cart_sweep(workload, sizes, args.repeats)
+                return time.perf_counter() - started
+            return await drive(workload, parse_mix(args.mix), args.duration, args.concurrency)
+        finally:
+            await workload.cleanup_uploads()
+
+    # Seed before startup so the search index and caches warm from real data
+    await Workload(server, resources, None, stats, 0).seed(args.products)
+    try:
+        if args.http:
+            import uvicorn
+
+            port = free_port()
+            uv = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+            serve_task = asyncio.create_task(uv.serve())
+            while not uv.started:
+                await asyncio.sleep(0.05)
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+                elapsed = await run(client)
+            uv.should_exit = True
+            await serve_task
+        else:
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                    elapsed = await run(client)
+    finally:
+        if not args.keep_db:
+            await resources.client.drop_database(os.environ["DB_NAME"])
+
+    summary = stats.summary(elapsed)
+    print_summary(summary)
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps({"routes": summary, "args": vars(args)}, indent=2, default=str))
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["routes"]
+        regressions = compare(summary, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent virtual users")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted scenario mix, name=weight,...")
+    parser.add_argument("--products", type=int, default=2000, help="catalog size to seed")
+    parser.add_argument("--clients", type=int, default=1000, help="distinct client IPs the virtual users send from")
+    parser.add_argument("--upload-size", type=int, default=1024 * 1024, help="bytes per upload")
+    parser.add_argument("--stripe-latency", type=float, default=0.05, help="fake Stripe round trip, seconds")
+    parser.add_argument("--cart-sweep", help="comma-separated cart sizes; measures checkout latency per size")
+    parser.add_argument("--repeats", type=int, default=50, help="checkouts per cart size in --cart-sweep")
+    parser.add_argument("--http", action="store_true", help="serve through uvicorn on loopback instead of in-process ASGI")
+    parser.add_argument("--in-memory", action="store_true", help="use an in-memory Motor stand-in instead of MONGO_URL")
+    parser.add_argument("--seed", type=int, default=2020)
+    parser.add_argument("--db-name", help="database to use (default: random bench_* name)")
+    parser.add_argument("--keep-db", action="store_true", help="do not drop the benchmark database afterwards")
+    parser.add_argument("--save-baseline", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression ratio for --compare")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,101 @@
+"""Cold-start timing: module import and app boot against targets.
+
+Each measurement runs in a fresh interpreter so nothing is already imported:
+
+* import: ``import server`` (must not touch the network, read ``MONGO_URL``
+  or import the payment SDKs)
+* boot: ``create_app()`` plus the lifespan startup (migrations, index checks,
+  search index build) against an empty throwaway database, with and without
+  ``prewarm``
+
+Run from ``backend/``::
+
+    python -m benchmarks.startup --runs 5 --max-import-ms 1500 --max-boot-ms 2500
+
+Exits non-zero when a median exceeds its target or the payment stack was
+imported eagerly.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import server
+elapsed = time.perf_counter() - started
+eager = sorted(m for m in ("stripe", "emergentintegrations") if m in sys.modules)
+print(json.dumps({"ms": elapsed * 1000, "eager": eager}))
+"""
+
+BOOT_PROBE = """
+import asyncio, json, os, sys, time
+started = time.perf_counter()
+import server
+from settings import Settings
+
+async def boot():
+    settings = Settings.from_env()
+    settings.prewarm = {prewarm}
+    app = server.create_app(settings)
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+    await app.state.resources.client.drop_database(settings.db_name)
+    return ready
+
+ready = asyncio.run(boot())
+print(json.dumps({{"ms": (ready - started) * 1000}}))
+"""
+
+
+def probe(code: str, env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=1500)
+    parser.add_argument("--max-boot-ms", type=float, default=2500)
+    args = parser.parse_args(argv)
+
+    env = {**os.environ, "PAYMENT_CLIENT": os.environ.get("PAYMENT_CLIENT", "benchmarks.fakes:FakePaymentClient")}
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    failures = []
+
+    # Import must work without any service configuration
+    import_env = {k: v for k, v in env.items() if k not in ("MONGO_URL", "DB_NAME")}
+    imports = [probe(IMPORT_PROBE, import_env) for _ in range(args.runs)]
+    import_ms = statistics.median(r["ms"] for r in imports)
+    print(f"import server: median {import_ms:.0f} ms (target {args.max_import_ms:.0f} ms)")
+    if import_ms > args.max_import_ms:
+        failures.append("import")
+    if imports[0]["eager"]:
+        print(f"payment modules imported eagerly: {', '.join(imports[0]['eager'])}")
+        failures.append("eager imports")
+
+    for prewarm in (False, True):
+        boots = [
+            probe(BOOT_PROBE.format(prewarm=prewarm), {**env, "DB_NAME": f"bench_boot_{uuid.uuid4().hex[:8]}"})
+            for _ in range(args.runs)
+        ]
+        boot_ms = statistics.median(r["ms"] for r in boots)
+        print(f"import + boot (prewarm={prewarm}): median {boot_ms:.0f} ms (target {args.max_boot_ms:.0f} ms)")
+        if boot_ms > args.max_boot_ms:
+            failures.append(f"boot prewarm={prewarm}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Streaming NDJSON/CSV parsing and export helpers for bulk catalog operations.
+
+Imports are parsed line by line straight from the request body and written in
+``bulk_write`` batches, so memory stays bounded by the batch size rather than
+the upload. Exports stream from a Mongo cursor one document at a time.
+"""
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from pymongo.errors import BulkWriteError
+
+from serialization import dumps
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+LIST_SEPARATOR = "|"
+LIST_FIELDS = {"images", "sizes", "colors"}
+
+PRODUCT_CSV_FIELDS = [
+    "id", "name", "description", "price", "category", "image_url",
+    "images", "sizes", "colors", "featured", "new_arrival", "in_stock", "created_at",
+]
+
+
+def decode_line(line: bytes) -> Union[str, UnicodeDecodeError]:
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError as e:
+        return e
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Union[str, UnicodeDecodeError]]:
+    """Yield decoded lines, or the decode error in place of a line that is not valid UTF-8.
+
+    Only the new chunk is split; the unfinished tail is kept as a list of pieces and
+    joined once, so a long line costs linear time however many chunks it spans.
+    """
+    pending: List[bytes] = []
+    async for chunk in chunks:
+        *lines, tail = chunk.split(b"\n")
+        if lines:
+            pending.append(lines[0])
+            lines[0] = b"".join(pending)
+            pending = []
+            for line in lines:
+                yield decode_line(line)
+        if tail:
+            pending.append(tail)
+    if pending:
+        yield decode_line(b"".join(pending))
+
+
+async def iter_ndjson_rows(lines: AsyncIterator[Union[str, UnicodeDecodeError]]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield ``(line_number, dict)`` pairs, or ``(line_number, error)`` for unparsable lines"""
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if isinstance(line, UnicodeDecodeError):
+            yield line_no, line
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("Expected a JSON object")
+            yield line_no, row
+        except ValueError as e:
+            yield line_no, e
+
+
+async def iter_csv_rows(lines: AsyncIterator[Union[str, UnicodeDecodeError]]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield rows of a headed CSV as dicts; list columns are ``|``-separated.
+
+    Quoted values may span lines: a record is complete once its quote count is even.
+    """
+    header: Optional[List[str]] = None
+    pending = ""
+    start_line = line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not pending:
+            start_line = line_no
+        if isinstance(line, UnicodeDecodeError):
+            # The record this line belonged to is unusable as a whole
+            yield start_line, line
+            pending = ""
+            continue
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield start_line, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield start_line, csv_row_to_dict(header, values)
+    if pending:
+        yield start_line, ValueError("Unterminated quoted value")
+
+
+def csv_row_to_dict(header: List[str], values: List[str]) -> Dict:
+    row = {}
+    for name, value in zip(header, values):
+        # Empty cells fall back to model defaults
+        if value.strip() == "":
+            continue
+        if name in LIST_FIELDS:
+            row[name] = [v.strip() for v in value.split(LIST_SEPARATOR) if v.strip()]
+        else:
+            row[name] = value
+    return row
+
+
+def csv_line(values: List) -> str:
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerow(values)
+    return out.getvalue()
+
+
+def document_to_csv_values(doc: Dict, fields: List[str]) -> List:
+    values = []
+    for name in fields:
+        value = doc.get(name, "")
+        if isinstance(value, list):
+            value = LIST_SEPARATOR.join(str(v) for v in value)
+        elif isinstance(value, bool):
+            value = "true" if value else "false"
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat()
+        values.append(value)
+    return values
+
+
+async def stream_export(cursor, fmt: str, csv_fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        yield csv_line(csv_fields).encode("utf-8")
+    async for doc in cursor:
+        if fmt == "csv":
+            yield csv_line(document_to_csv_values(doc, csv_fields)).encode("utf-8")
+        else:
+            yield dumps(doc) + b"\n"
+
+
+async def write_import_batch(collection, batch: List[Tuple[int, object]], report: Dict) -> None:
+    """Apply one batch of ``(line_number, write_op)`` with an unordered bulk write, folding results into ``report``"""
+    ops = [op for _, op in batch]
+    try:
+        result = await collection.bulk_write(ops, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for write_error in details.get("writeErrors", []):
+            add_import_error(report, batch[write_error["index"]][0], write_error.get("errmsg", "Write failed"))
+    report["inserted"] += details.get("nInserted", 0) + details.get("nUpserted", 0)
+    report["updated"] += details.get("nMatched", 0)
+
+
+def add_import_error(report: Dict, line_no: int, message: str) -> None:
+    report["error_count"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line_no, "error": message})
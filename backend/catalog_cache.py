@@ -0,0 +1,69 @@
+"""In-process snapshot cache for the public catalog endpoints.
+
+The catalog only changes when an admin writes to it, so storefront reads are
+served from pre-serialized snapshots keyed by the request filters. Admin write
+routes call ``invalidate()`` which bumps the version; stale entries are dropped
+and rebuilt lazily on the next read. A short TTL bounds staleness when several
+workers each hold their own copy.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from serialization import dumps
+
+
+class CatalogEntry:
+    __slots__ = ("version", "body", "headers", "etag", "expires_at")
+
+    def __init__(self, version: int, body: bytes, ttl: float, headers: Optional[Dict[str, str]] = None):
+        self.version = version
+        self.body = body
+        self.headers = headers or {}
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+
+class CatalogCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, CatalogEntry]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[CatalogEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != self.version or entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, content: Any, version: int, headers: Optional[Dict[str, str]] = None) -> CatalogEntry:
+        """Serialize ``content`` and store it, unless the catalog changed while it was being built."""
+        body = dumps(content)
+        entry = CatalogEntry(version, body, self.ttl, headers)
+        if version == self.version:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self._entries.clear()
+
+    def respond(self, request: Request, entry: CatalogEntry) -> Response:
+        headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match", "")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if entry.etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,72 @@
+"""Request coalescing helpers: single-flight calls and a small TTL cache."""
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers asking for the same key.
+
+    The shared call is shielded, so a caller that disconnects does not cancel
+    the work the other callers are waiting on.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(future)
+
+
+class TTLCache:
+    """Small LRU cache with per-entry expiry.
+
+    ``pop`` also bumps the key's generation. A caller that reads
+    ``generation(key)`` before fetching and passes it to ``put`` has its
+    write dropped if the key was invalidated meanwhile, so a slow fetch that
+    started before the invalidation cannot cache the stale value.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 2.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._generations: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._counter = itertools.count(1)
+        # Generation of the newest invalidation forgotten from _generations
+        self._floor = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    def generation(self, key: Hashable) -> int:
+        return self._generations.get(key, self._floor)
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None) -> None:
+        if generation is not None and generation != self.generation(key):
+            return
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+        self._generations[key] = next(self._counter)
+        self._generations.move_to_end(key)
+        while len(self._generations) > self.max_entries:
+            self._floor = max(self._floor, self._generations.popitem(last=False)[1])
@@ -0,0 +1,73 @@
+"""Resized WebP/JPEG derivatives for uploaded images.
+
+Resizing is CPU-bound, so ``generate_variants`` runs in a process pool off the
+event loop; each app owns its pool (see ``create_pool``). Each source image
+yields one file per (size, format) pair, never upscaled, written next to the
+original under ``variants/``.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+VARIANT_WIDTHS = {"thumb": 320, "grid": 640, "detail": 1280}
+VARIANT_FORMATS = {"webp": ("WEBP", 80), "jpeg": ("JPEG", 82)}
+SKIPPED_EXTENSIONS = {"gif"}
+
+
+def generate_variants(src_path: str, out_dir: str, url_prefix: str) -> List[Dict]:
+    from PIL import Image, ImageOps
+
+    src = Path(src_path)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    variants = []
+    with Image.open(src) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        seen_widths = set()
+        for name, target in VARIANT_WIDTHS.items():
+            width = min(target, image.width)
+            if width in seen_widths:
+                continue
+            seen_widths.add(width)
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+            for fmt, (pil_format, quality) in VARIANT_FORMATS.items():
+                frame = resized.convert("RGB") if pil_format == "JPEG" and resized.mode != "RGB" else resized
+                filename = f"{src.stem}_{name}.{'jpg' if fmt == 'jpeg' else fmt}"
+                frame.save(out / filename, pil_format, quality=quality, optimize=True)
+                variants.append({
+                    "name": name,
+                    "width": width,
+                    "height": height,
+                    "format": fmt,
+                    "url": f"{url_prefix}/{filename}",
+                    "bytes": (out / filename).stat().st_size,
+                })
+    return variants
+
+
+def create_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=int(os.environ.get("IMAGE_WORKERS", "2")))
+
+
+async def run_generate_variants(pool: ProcessPoolExecutor, src_path: Path, out_dir: Path, url_prefix: str) -> List[Dict]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, generate_variants, str(src_path), str(out_dir), url_prefix)
+
+
+def pick_variant(variants: List[Dict], width: int, formats: List[str]) -> Optional[Dict]:
+    """Smallest variant at least ``width`` wide in the first available format, else the largest one"""
+    for fmt in formats:
+        candidates = sorted((v for v in variants if v["format"] == fmt), key=lambda v: v["width"])
+        if not candidates:
+            continue
+        for variant in candidates:
+            if variant["width"] >= width:
+                return variant
+        return candidates[-1]
+    return None
@@ -0,0 +1,106 @@
+"""MongoDB index declarations and idempotent provisioning.
+
+Every collection the API queries is listed here together with the indexes its
+hot paths rely on. ``ensure_indexes`` is run on startup; creating an index that
+already exists with the same spec is a no-op, so it is safe on every boot.
+"""
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+NEWEST_FIRST = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(NEWEST_FIRST, name="created_at_id"),
+        IndexModel([("category", ASCENDING)] + NEWEST_FIRST, name="category_created_at_id"),
+        IndexModel([("featured", ASCENDING)] + NEWEST_FIRST, name="featured_created_at_id"),
+        IndexModel([("new_arrival", ASCENDING)] + NEWEST_FIRST, name="new_arrival_created_at_id"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("session_id", ASCENDING)], name="session_id"),
+        IndexModel(NEWEST_FIRST, name="created_at_id"),
+        IndexModel([("paid_batch", ASCENDING)], name="paid_batch", sparse=True),
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True, sparse=True),
+    ],
+    "payment_transactions": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+    ],
+    "webhook_events": [
+        IndexModel([("event_id", ASCENDING)], name="event_id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("received_at", ASCENDING)], name="status_received_at"),
+        IndexModel([("lease", ASCENDING)], name="lease", sparse=True),
+    ],
+    "sales_rollups": [
+        IndexModel([("dimension", ASCENDING), ("day", ASCENDING), ("key", ASCENDING)], name="dimension_day_key_unique", unique=True),
+    ],
+    "inventory": [
+        IndexModel([("product_id", ASCENDING), ("sku", ASCENDING)], name="product_id_sku_unique", unique=True),
+    ],
+    "reservations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)], name="status_expires_at"),
+        IndexModel([("batch", ASCENDING)], name="batch", sparse=True),
+    ],
+    "rate_limits": [
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=3600),
+    ],
+    "admin_users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "revoked_tokens": [
+        IndexModel([("jti", ASCENDING)], name="jti_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "lookbook": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "image_variants": [
+        IndexModel([("source", ASCENDING)], name="source_unique", unique=True),
+    ],
+    "videos": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("active", ASCENDING)], name="active"),
+    ],
+}
+
+
+async def ensure_indexes(db) -> Dict[str, Dict[str, List[str]]]:
+    """Create any missing required indexes and report what exists per collection.
+
+    A failure on one collection (e.g. duplicate keys blocking a unique index) is
+    logged and reported as missing rather than aborting startup.
+    """
+    report = {}
+    for collection_name, models in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        try:
+            await collection.create_indexes(models)
+        except PyMongoError as e:
+            logger.error(f"Failed to create indexes on {collection_name}: {e}")
+        report[collection_name] = await index_status(collection, models)
+        if report[collection_name]["missing"]:
+            logger.warning(f"{collection_name} is missing indexes: {', '.join(report[collection_name]['missing'])}")
+        else:
+            logger.info(f"{collection_name} indexes: {', '.join(report[collection_name]['existing'])}")
+    return report
+
+
+async def index_status(collection, models: List[IndexModel]) -> Dict[str, List[str]]:
+    existing = await collection.index_information()
+    missing = [m.document["name"] for m in models if m.document["name"] not in existing]
+    return {"existing": sorted(existing), "missing": missing}
+
+
+async def describe_indexes(db) -> Dict[str, Dict[str, List[str]]]:
+    return {
+        name: await index_status(db[name], models)
+        for name, models in REQUIRED_INDEXES.items()
+    }
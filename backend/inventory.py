@@ -0,0 +1,181 @@
+"""Per-size/color stock with atomic checkout reservations.
+
+Stock lives in ``inventory``, one document per (product, sku) where the sku is
+``"{size}|{color}"`` (``"{size}|"`` when a product is only tracked by size),
+with ``available``, ``reserved`` and ``sold`` counters. Products without any
+inventory documents are untracked and never block checkout.
+
+Checkout takes stock with one conditional update per line
+(``available >= qty`` then ``$inc``), so concurrent buyers of the last units
+race inside MongoDB's per-document atomicity instead of a lock or a
+read-modify-write; a cart that cannot be fully reserved gives back what it
+took. The reservation document is written only after every line is held, and
+releases flip its status before returning stock, so a crash at any point can
+strand units (undersell) but never oversell.
+
+Reservations are held for ``RESERVATION_TTL`` seconds. ``release_expired``
+returns lapsed holds to ``available``; paying converts a hold to ``sold``. A
+payment that lands after its hold lapsed is sold from remaining stock if any,
+otherwise the order is reported back as a shortfall.
+"""
+import asyncio
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+INVENTORY = "inventory"
+RESERVATIONS = "reservations"
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id: str, size: str, color: str = ""):
+        super().__init__(f"{product_id} {size} {color}".strip())
+        self.product_id = product_id
+        self.size = size
+        self.color = color
+
+
+def sku_of(size: str, color: str = "") -> str:
+    return f"{size}|{color}"
+
+
+async def _take(db, line: Dict) -> bool:
+    result = await db[INVENTORY].update_one(
+        {"product_id": line["product_id"], "sku": line["sku"], "available": {"$gte": line["quantity"]}},
+        {"$inc": {"available": -line["quantity"], "reserved": line["quantity"]}}
+    )
+    return result.modified_count == 1
+
+
+async def _apply(db, lines: List[Dict], changes: Dict[str, int]) -> None:
+    """Move each line's quantity between counters, e.g. {"reserved": -1, "sold": 1}"""
+    totals: Dict[tuple, int] = defaultdict(int)
+    for line in lines:
+        totals[(line["product_id"], line["sku"])] += line["quantity"]
+    if totals:
+        await db[INVENTORY].bulk_write([
+            UpdateOne({"product_id": pid, "sku": sku}, {"$inc": {field: sign * qty for field, sign in changes.items()}})
+            for (pid, sku), qty in totals.items()
+        ], ordered=False)
+
+
+async def reserve(db, order_id: str, items: List[Dict], ttl: float) -> Optional[Dict]:
+    """Hold stock for every tracked cart line, all or nothing; raises OutOfStock"""
+    product_ids = list({item["product_id"] for item in items})
+    tracked = await db[INVENTORY].find(
+        {"product_id": {"$in": product_ids}}, {"_id": 0, "product_id": 1, "sku": 1}
+    ).to_list(None)
+    if not tracked:
+        return None
+    tracked_products = {t["product_id"] for t in tracked}
+    skus = {(t["product_id"], t["sku"]) for t in tracked}
+
+    needed: Dict[tuple, int] = defaultdict(int)
+    for item in items:
+        pid = item["product_id"]
+        if pid not in tracked_products:
+            continue
+        sku = sku_of(item["size"], item.get("color", ""))
+        if (pid, sku) not in skus:
+            sku = sku_of(item["size"])
+        if (pid, sku) not in skus:
+            raise OutOfStock(pid, item["size"], item.get("color", ""))
+        needed[(pid, sku)] += item["quantity"]
+    if not needed:
+        return None
+
+    lines = [{"product_id": pid, "sku": sku, "quantity": qty} for (pid, sku), qty in needed.items()]
+    taken = await asyncio.gather(*[_take(db, line) for line in lines])
+    if not all(taken):
+        await _apply(db, [line for line, ok in zip(lines, taken) if ok], {"available": 1, "reserved": -1})
+        line = lines[taken.index(False)]
+        size, _, color = line["sku"].partition("|")
+        raise OutOfStock(line["product_id"], size, color)
+
+    now = datetime.now(timezone.utc)
+    reservation = {
+        "id": str(uuid.uuid4()),
+        "order_id": order_id,
+        "status": "held",
+        "lines": lines,
+        "expires_at": now + timedelta(seconds=ttl),
+        "created_at": now,
+    }
+    await db[RESERVATIONS].insert_one(dict(reservation))
+    return reservation
+
+
+async def release(db, query: Dict) -> int:
+    """Return the stock of held reservations matching ``query``"""
+    batch = str(uuid.uuid4())
+    result = await db[RESERVATIONS].update_many(
+        {**query, "status": "held"},
+        {"$set": {"status": "released", "batch": batch, "released_at": datetime.now(timezone.utc)}}
+    )
+    if result.modified_count:
+        docs = await db[RESERVATIONS].find({"batch": batch}, {"_id": 0, "lines": 1}).to_list(None)
+        await _apply(db, [line for doc in docs for line in doc["lines"]], {"available": 1, "reserved": -1})
+    return result.modified_count
+
+
+async def release_orders(db, order_ids: List[str]) -> int:
+    return await release(db, {"order_id": {"$in": order_ids}}) if order_ids else 0
+
+
+async def release_expired(db) -> int:
+    return await release(db, {"expires_at": {"$lt": datetime.now(timezone.utc)}})
+
+
+async def convert(db, order_ids: List[str]) -> List[str]:
+    """Turn paid orders' holds into sales; returns order ids whose stock ran out"""
+    if not order_ids:
+        return []
+    batch = str(uuid.uuid4())
+    result = await db[RESERVATIONS].update_many(
+        {"order_id": {"$in": order_ids}, "status": "held"},
+        {"$set": {"status": "converted", "batch": batch}}
+    )
+    if result.modified_count:
+        docs = await db[RESERVATIONS].find({"batch": batch}, {"_id": 0, "lines": 1}).to_list(None)
+        await _apply(db, [line for doc in docs for line in doc["lines"]], {"reserved": -1, "sold": 1})
+
+    # Paid after the hold lapsed: sell from whatever stock is left
+    shortfall = []
+    late = await db[RESERVATIONS].find(
+        {"order_id": {"$in": order_ids}, "status": "released"}, {"_id": 0, "id": 1, "order_id": 1, "lines": 1}
+    ).to_list(None)
+    for doc in late:
+        claimed = await db[RESERVATIONS].update_one({"id": doc["id"], "status": "released"}, {"$set": {"status": "converting"}})
+        if not claimed.modified_count:
+            continue
+        taken = await asyncio.gather(*[_take(db, line) for line in doc["lines"]])
+        await _apply(db, [line for line, ok in zip(doc["lines"], taken) if ok], {"reserved": -1, "sold": 1})
+        status = "converted" if all(taken) else "shortfall"
+        await db[RESERVATIONS].update_one({"id": doc["id"]}, {"$set": {"status": status}})
+        if status == "shortfall":
+            shortfall.append(doc["order_id"])
+    return shortfall
+
+
+async def set_stock(db, product_id: str, levels: List[Dict]) -> None:
+    """Set the available count of each (size, color) of a product"""
+    await db[INVENTORY].bulk_write([
+        UpdateOne(
+            {"product_id": product_id, "sku": sku_of(level["size"], level.get("color", ""))},
+            {
+                "$set": {"available": level["available"]},
+                "$setOnInsert": {"size": level["size"], "color": level.get("color", ""), "reserved": 0, "sold": 0},
+            },
+            upsert=True
+        )
+        for level in levels
+    ], ordered=False)
+
+
+async def stock_levels(db, product_id: str) -> List[Dict]:
+    return await db[INVENTORY].find(
+        {"product_id": product_id}, {"_id": 0, "product_id": 0}
+    ).sort([("size", 1), ("color", 1)]).to_list(None)
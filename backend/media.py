@@ -0,0 +1,181 @@
+"""ASGI app serving uploaded media with caching, Range and precompressed variants.
+
+Files are read through the media storage backend (see ``storage``), which
+hands back a local path, downloading remote objects into its cache first.
+Uploads are written once under content-hash (or, for older ones, UUID) keys
+and never modified, so they are served with ``Cache-Control: immutable`` and a
+strong ETag derived from the key and size, which is the same on every node.
+Single byte ranges are answered with 206 so video seeking only transfers what
+the player asks for. When the server offers the ASGI zero-copy send extension
+the file descriptor is handed over directly; otherwise the file is streamed in
+chunks from a worker thread.
+
+``<name>.br`` / ``<name>.gz`` siblings are served in place of the requested
+file when ``Accept-Encoding`` allows that coding. Resized image formats are
+not negotiated here; clients pick them from ``/api/images/variant`` or the
+variant URLs stored on each document.
+"""
+import email.utils
+import hashlib
+import mimetypes
+import re
+from typing import Dict, List, Optional, Tuple
+
+import anyio
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class MediaFiles:
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            await self.send_empty(send, 405, [(b"allow", b"GET, HEAD")])
+            return
+
+        key = self.resolve(scope)
+        path = await self.storage.local_path(key) if key else None
+        if path is None:
+            await self.send_empty(send, 404)
+            return
+
+        request_headers = Headers(scope=scope)
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        extra_headers: List[Tuple[bytes, bytes]] = []
+
+        if "range" not in request_headers:
+            accepted = parse_qualities(request_headers.get("accept-encoding", ""))
+            for encoding, suffix in ENCODINGS:
+                if accepted.get(encoding, accepted.get("*", 0.0)) <= 0:
+                    continue
+                compressed = await self.storage.local_path(key + suffix)
+                if compressed is not None:
+                    key, path = key + suffix, compressed
+                    extra_headers.append((b"content-encoding", encoding.encode()))
+                    break
+
+        stat = await anyio.Path(path).stat()
+        etag = f'"{stat.st_size:x}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"'
+        headers = [
+            (b"content-type", content_type.encode()),
+            (b"etag", etag.encode()),
+            (b"last-modified", email.utils.formatdate(stat.st_mtime, usegmt=True).encode()),
+            (b"cache-control", CACHE_CONTROL.encode()),
+            (b"accept-ranges", b"bytes"),
+            (b"vary", b"Accept-Encoding"),
+        ] + extra_headers
+
+        if etag in [t.strip() for t in request_headers.get("if-none-match", "").split(",")]:
+            await self.send_empty(send, 304, headers)
+            return
+
+        size = stat.st_size
+        start, end = 0, size - 1
+        status = 200
+        byte_range = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if byte_range and (if_range is None or if_range == etag):
+            parsed = parse_range(byte_range, size)
+            if parsed is False:
+                await self.send_empty(send, 416, headers + [(b"content-range", f"bytes */{size}".encode())])
+                return
+            if parsed is not None:
+                start, end = parsed
+                status = 206
+                headers.append((b"content-range", f"bytes {start}-{end}/{size}".encode()))
+
+        length = max(0, end - start + 1)
+        headers.append((b"content-length", str(length).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if scope["method"] == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            f = await anyio.to_thread.run_sync(open, path, "rb")
+            try:
+                await send({"type": "http.response.zerocopysend", "file": f.fileno(), "offset": start, "count": length})
+            finally:
+                await anyio.to_thread.run_sync(f.close)
+            return
+
+        async with await anyio.open_file(path, "rb") as f:
+            await f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b""})
+
+    def resolve(self, scope: Scope) -> Optional[str]:
+        """Storage key for the request path; hidden files and traversal are rejected"""
+        route_path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and route_path.startswith(root_path):
+            route_path = route_path[len(root_path):]
+        parts = [p for p in route_path.split("/") if p]
+        if not parts or any(p in (".", "..") or p.startswith(".") or "\\" in p for p in parts):
+            return None
+        return "/".join(parts)
+
+    @staticmethod
+    async def send_empty(send: Send, status: int, headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        headers = [h for h in (headers or []) if h[0] != b"content-length"]
+        await send({"type": "http.response.start", "status": status, "headers": headers + [(b"content-length", b"0")]})
+        await send({"type": "http.response.body", "body": b""})
+
+
+def parse_range(header: str, size: int):
+    """Parse a single-range ``bytes=`` header.
+
+    Returns ``(start, end)`` inclusive, ``None`` when the header should be
+    ignored (multiple or malformed ranges) and ``False`` when unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            return False
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def parse_qualities(header: str) -> Dict[str, float]:
+    """Map each coding in an ``Accept-Encoding`` header to its q-value; ``q=0`` means refused"""
+    qualities = {}
+    for item in header.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+    return qualities
@@ -0,0 +1,247 @@
+"""Process-local metrics in the Prometheus text exposition format.
+
+A deliberately small implementation (counters, gauges, histograms with labels)
+so the API does not need a metrics client dependency. Updates take a lock
+because pymongo's command listeners fire on Motor's worker threads.
+
+Also provides the ASGI middleware timing every request by route template, the
+pymongo command listener, and an optional stack-sampling profiler enabled with
+``PROFILER_INTERVAL_MS`` that aggregates the event loop thread's stacks in
+collapsed (flamegraph) format.
+"""
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+IGNORED_MONGO_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue"}
+
+_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        with _lock:
+            self._values[self._key(labels)] += amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with _lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+http_requests_in_flight = Gauge("http_requests_in_flight", "Requests currently being handled")
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route template",
+    ("method", "route", "status"),
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency",
+    ("collection", "command"),
+)
+mongo_command_errors = Counter("mongo_command_errors_total", "Failed MongoDB commands", ("collection", "command"))
+stripe_call_duration = Histogram("stripe_call_duration_seconds", "Payment provider call latency", ("operation",))
+stripe_call_errors = Counter("stripe_call_errors_total", "Failed payment provider calls", ("operation",))
+admission_rejections = Counter(
+    "admission_rejections_total", "Requests rejected by admission control", ("route_class", "reason")
+)
+startup_duration = Gauge("app_startup_seconds", "Time the last application startup took")
+upload_bytes = Counter("upload_bytes_total", "Bytes received by upload endpoints", ("kind",))
+upload_duration = Histogram(
+    "upload_duration_seconds", "Time to receive and store an upload", ("kind",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+
+def render_metrics() -> str:
+    with _lock:
+        lines = [line for metric in REGISTRY for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            # The router stores the matched route in the scope; label by its template to bound cardinality
+            route = scope.get("route")
+            if route is not None:
+                label = route.path
+            elif scope["path"].startswith("/api/uploads/"):
+                label = "/api/uploads"
+            else:
+                label = "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started, method=scope["method"], route=label, status=status
+            )
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._pending: Dict[tuple, str] = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_MONGO_COMMANDS:
+            return
+        target = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            mongo_command_duration.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            mongo_command_duration.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+            mongo_command_errors.inc(collection=collection, command=event.command_name)
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a daemon thread"""
+
+    def __init__(self, interval: float, thread_id: Optional[int] = None, max_depth: int = 64):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.max_depth = max_depth
+        self.samples: Dict[str, int] = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                with _lock:
+                    self.samples[key] += 1
+
+    def collapsed(self) -> str:
+        with _lock:
+            return "\n".join(f"{stack} {count}" for stack, count in sorted(self.samples.items(), key=lambda s: -s[1])) + "\n"
+
+    def reset(self) -> None:
+        with _lock:
+            self.samples.clear()
@@ -0,0 +1,40 @@
+"""Data migrations, run at startup and runnable by hand with ``python migrations.py``.
+
+Each migration is idempotent and only touches documents that still need it.
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DATED_COLLECTIONS = ["products", "lookbook", "videos", "orders", "payment_transactions"]
+
+
+async def migrate_created_at_to_dates(db) -> int:
+    """Convert ISO-string ``created_at`` values to native BSON dates, server side"""
+    converted = 0
+    for name in DATED_COLLECTIONS:
+        result = await db[name].update_many(
+            {"created_at": {"$type": "string"}},
+            [{"$set": {"created_at": {"$toDate": "$created_at"}}}]
+        )
+        if result.modified_count:
+            logger.info(f"Converted created_at to dates on {result.modified_count} {name} documents")
+        converted += result.modified_count
+    return converted
+
+
+async def run_migrations(db) -> None:
+    await migrate_created_at_to_dates(db)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    asyncio.run(run_migrations(client[os.environ['DB_NAME']]))
@@ -0,0 +1,152 @@
+"""Long-lived payment client shared by the checkout and webhook routes.
+
+One client is created at startup and reused for every request, so the
+underlying Stripe HTTP client keeps its connection pool (and TLS sessions)
+warm instead of being rebuilt per call. Network calls are bounded by a
+timeout; idempotent status reads are retried with exponential backoff, while
+session creation relies on the Stripe SDK's own retries, which attach
+idempotency keys.
+
+The implementation is pluggable: set ``PAYMENT_CLIENT=module:Class`` to load a
+different class with the same interface (e.g. a fake for benchmarks), or
+``STRIPE_API_BASE`` to point the real client at a local Stripe stand-in.
+Set ``BACKEND_URL`` in production: without it the webhook URL sent to Stripe is
+derived from each request's Host header.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import time
+from typing import List, Optional
+
+from metrics import stripe_call_duration, stripe_call_errors
+
+logger = logging.getLogger(__name__)
+
+
+class StripePaymentClient:
+    # The checkout wrapper only reads the SDK's module-level settings, so the most recently
+    # opened client's HTTP pool is installed there and the one before it comes back on close()
+    _open: List["StripePaymentClient"] = []
+    _sdk_defaults: Optional[tuple] = None
+
+    def __init__(
+        self,
+        api_key: str,
+        webhook_url: Optional[str] = None,
+        timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff: float = 0.25,
+        api_base: Optional[str] = None,
+    ):
+        import stripe
+
+        self.api_key = api_key
+        self.webhook_url = webhook_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.api_base = api_base
+        self.http_client = stripe.new_default_http_client(timeout=timeout)
+        self._stripe = stripe
+        self._checkout = None
+
+        if not StripePaymentClient._open:
+            StripePaymentClient._sdk_defaults = (stripe.default_http_client, stripe.api_base, stripe.max_network_retries)
+        StripePaymentClient._open.append(self)
+        self._install()
+        self._retryable = (stripe.APIConnectionError, stripe.RateLimitError, asyncio.TimeoutError)
+
+    def _install(self) -> None:
+        self._stripe.default_http_client = self.http_client
+        self._stripe.max_network_retries = self.max_retries
+        self._stripe.api_base = self.api_base or StripePaymentClient._sdk_defaults[1]
+
+    def _get_checkout(self, base_url: str):
+        from emergentintegrations.payments.stripe.checkout import StripeCheckout
+
+        if self.webhook_url is None:
+            # Derived from this request's Host header, so it is never kept for later requests
+            return StripeCheckout(api_key=self.api_key, webhook_url=f"{base_url}api/webhook/stripe")
+        if self._checkout is None:
+            self._checkout = StripeCheckout(api_key=self.api_key, webhook_url=self.webhook_url)
+        return self._checkout
+
+    async def create_checkout_session(self, checkout_request: dict, base_url: str):
+        from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
+
+        checkout = self._get_checkout(base_url)
+        request = CheckoutSessionRequest(**checkout_request)
+        return await asyncio.wait_for(checkout.create_checkout_session(request), self.timeout)
+
+    async def get_checkout_status(self, session_id: str, base_url: str):
+        checkout = self._get_checkout(base_url)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await asyncio.wait_for(checkout.get_checkout_status(session_id), self.timeout)
+            except self._retryable as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(f"Stripe status lookup failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def handle_webhook(self, body: bytes, signature: str, base_url: str):
+        return await self._get_checkout(base_url).handle_webhook(body, signature)
+
+    async def close(self) -> None:
+        self._checkout = None
+        if self not in StripePaymentClient._open:
+            return
+        StripePaymentClient._open.remove(self)
+        if StripePaymentClient._open:
+            StripePaymentClient._open[-1]._install()
+        else:
+            stripe = self._stripe
+            stripe.default_http_client, stripe.api_base, stripe.max_network_retries = StripePaymentClient._sdk_defaults
+        self.http_client.close()
+
+
+class InstrumentedPaymentClient:
+    """Wraps any payment client to record per-operation latency and errors"""
+
+    OPERATIONS = ("create_checkout_session", "get_checkout_status", "handle_webhook")
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if name not in self.OPERATIONS:
+            return attr
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            except Exception:
+                stripe_call_errors.inc(operation=name)
+                raise
+            finally:
+                stripe_call_duration.observe(time.perf_counter() - started, operation=name)
+        return timed
+
+
+def create_payment_client():
+    """Build the payment client configured by the environment"""
+    if not os.environ.get("BACKEND_URL"):
+        logger.warning("BACKEND_URL is not set; Stripe webhook URLs are derived from each request's Host header")
+    settings = {
+        "api_key": os.environ.get("STRIPE_API_KEY", ""),
+        "webhook_url": f"{os.environ['BACKEND_URL']}/api/webhook/stripe" if os.environ.get("BACKEND_URL") else None,
+        "timeout": float(os.environ.get("STRIPE_TIMEOUT", "10")),
+        "max_retries": int(os.environ.get("STRIPE_MAX_RETRIES", "2")),
+        "api_base": os.environ.get("STRIPE_API_BASE") or None,
+    }
+    client_path = os.environ.get("PAYMENT_CLIENT")
+    if client_path:
+        module_name, _, class_name = client_path.partition(":")
+        client_class = getattr(importlib.import_module(module_name), class_name)
+        return InstrumentedPaymentClient(client_class(**settings))
+    return InstrumentedPaymentClient(StripePaymentClient(**settings))
@@ -0,0 +1,222 @@
+"""In-process inverted index for product search with facet counts.
+
+Text from ``name``, ``description``, ``colors`` and ``sizes`` is tokenized into
+postings of ``term -> {product_id: weight}``; a query matches products that
+contain every query token (the last token also matches as a prefix, for
+type-ahead), ranked by summed field weights. Category, color, size and price
+bucket each keep ``value -> set(product_id)`` postings, so filters and facet
+counts are set intersections rather than per-product Python loops.
+
+The index is kept current by the product write routes calling ``upsert`` and
+``remove``; ``build`` replaces it wholesale from a full product scan.
+"""
+import bisect
+import heapq
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+FIELD_WEIGHTS = {"name": 3.0, "colors": 2.0, "sizes": 1.0, "description": 1.0}
+PRICE_BUCKETS = [(0, 25), (25, 50), (50, 100), (100, 200), (200, None)]
+FACETS = ("category", "color", "size", "price")
+# Bound type-ahead expansion so very short prefixes cannot fan out over the whole vocabulary
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_TERMS = 32
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def price_bucket(price: float) -> str:
+    for low, high in PRICE_BUCKETS:
+        if high is None:
+            return f"{low}+"
+        if price < high:
+            return f"{low}-{high}"
+    return ""
+
+
+def facet_values(product: Dict) -> Dict[str, Set[str]]:
+    return {
+        "category": {product.get("category", "")},
+        "color": set(product.get("colors", [])),
+        "size": set(product.get("sizes", [])),
+        "price": {price_bucket(product.get("price", 0))},
+    }
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._docs: Dict[str, Dict] = {}
+        self._terms: Dict[str, Dict[str, float]] = {}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # facet -> lowercased value -> product ids; labels keep the original spelling
+        self._facets: Dict[str, Dict[str, Set[str]]] = {f: defaultdict(set) for f in FACETS}
+        self._labels: Dict[str, Dict[str, str]] = {f: {} for f in FACETS}
+        self._sorted_terms: Optional[List[str]] = None
+        self._recency: Optional[List[str]] = None
+        self._prices: Optional[List[tuple]] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def build(self, products: Iterable[Dict]) -> None:
+        self._docs.clear()
+        self._terms.clear()
+        self._postings.clear()
+        for facet in FACETS:
+            self._facets[facet].clear()
+            self._labels[facet].clear()
+        for product in products:
+            self._add(product)
+        self._dirty()
+
+    def upsert(self, product: Dict) -> None:
+        self._remove(product["id"])
+        self._add(product)
+        self._dirty()
+
+    def remove(self, product_id: str) -> None:
+        self._remove(product_id)
+        self._dirty()
+
+    def _dirty(self) -> None:
+        self._sorted_terms = None
+        self._recency = None
+        self._prices = None
+
+    def _add(self, product: Dict) -> None:
+        product_id = product["id"]
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            value = product.get(field) or ""
+            text = " ".join(value) if isinstance(value, list) else value
+            for token in tokenize(text):
+                weights[token] += weight
+        for token, weight in weights.items():
+            self._postings[token][product_id] = weight
+        for facet, values in facet_values(product).items():
+            for value in values:
+                key = value.lower()
+                self._facets[facet][key].add(product_id)
+                self._labels[facet].setdefault(key, value)
+        self._terms[product_id] = weights
+        self._docs[product_id] = product
+
+    def _remove(self, product_id: str) -> None:
+        product = self._docs.pop(product_id, None)
+        if product is None:
+            return
+        for token in self._terms.pop(product_id, {}):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(product_id, None)
+                if not posting:
+                    del self._postings[token]
+        for facet, values in facet_values(product).items():
+            for value in values:
+                key = value.lower()
+                ids = self._facets[facet].get(key)
+                if ids is not None:
+                    ids.discard(product_id)
+                    if not ids:
+                        del self._facets[facet][key]
+                        self._labels[facet].pop(key, None)
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return [prefix]
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        end = bisect.bisect_left(self._sorted_terms, prefix + "\uffff")
+        return self._sorted_terms[start:min(end, start + MAX_PREFIX_TERMS)]
+
+    def _match(self, query: str) -> Optional[Dict[str, float]]:
+        """Score products containing every query token; None means no text query"""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        scores: Optional[Dict[str, float]] = None
+        for i, token in enumerate(tokens):
+            terms = self._prefix_terms(token) if i == len(tokens) - 1 else [token]
+            token_scores: Dict[str, float] = {}
+            for term in terms:
+                posting = self._postings.get(term, {})
+                if term == token and not token_scores:
+                    token_scores = dict(posting)
+                    continue
+                # Exact hits outrank prefix completions
+                factor = 1.0 if term == token else 0.5
+                for product_id, weight in posting.items():
+                    token_scores[product_id] = token_scores.get(product_id, 0.0) + weight * factor
+            if scores is None:
+                scores = token_scores
+            else:
+                small, large = (scores, token_scores) if len(scores) <= len(token_scores) else (token_scores, scores)
+                scores = {pid: score + large[pid] for pid, score in small.items() if pid in large}
+            if not scores:
+                return {}
+        return scores
+
+    def _price_range(self, min_price: Optional[float], max_price: Optional[float]) -> Set[str]:
+        if self._prices is None:
+            self._prices = sorted((doc.get("price", 0), pid) for pid, doc in self._docs.items())
+        start = 0 if min_price is None else bisect.bisect_left(self._prices, (min_price,))
+        end = len(self._prices) if max_price is None else bisect.bisect_right(self._prices, (max_price, "\uffff"))
+        return {pid for _, pid in self._prices[start:end]}
+
+    def search(
+        self,
+        query: str = "",
+        category: Optional[str] = None,
+        color: Optional[str] = None,
+        size: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        limit: int = 24,
+        offset: int = 0,
+    ) -> Dict:
+        scores = self._match(query)
+        matched: Optional[Set[str]] = None if scores is None else set(scores)
+        for facet, value in (("category", category), ("color", color), ("size", size)):
+            if value:
+                ids = self._facets[facet].get(value.lower(), set())
+                matched = set(ids) if matched is None else matched & ids
+        if min_price is not None or max_price is not None:
+            ids = self._price_range(min_price, max_price)
+            matched = ids if matched is None else matched & ids
+
+        facets = {}
+        for facet in FACETS:
+            labels = self._labels[facet]
+            counts = {}
+            for key, ids in self._facets[facet].items():
+                count = len(ids) if matched is None else len(ids & matched)
+                if count:
+                    counts[labels[key]] = count
+            facets[facet] = counts
+
+        wanted = offset + limit
+        if scores is not None:
+            top = heapq.nlargest(wanted, matched, key=scores.__getitem__)
+        else:
+            if self._recency is None:
+                self._recency = sorted(self._docs, key=lambda pid: self._docs[pid]["created_at"], reverse=True)
+            if matched is None:
+                top = self._recency[:wanted]
+            else:
+                top = []
+                for pid in self._recency:
+                    if pid in matched:
+                        top.append(pid)
+                        if len(top) == wanted:
+                            break
+
+        return {
+            "results": [self._docs[pid] for pid in top[offset:]],
+            "total": len(self._docs) if matched is None else len(matched),
+            "facets": facets,
+        }
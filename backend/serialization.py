@@ -0,0 +1,66 @@
+"""Fast JSON response path for documents read straight from MongoDB.
+
+Documents written by this API are already valid, so list endpoints skip the
+per-item Pydantic round trip: missing optional fields are filled from the
+model defaults and the result is encoded with orjson (stdlib json is only a
+fallback for bare environments). Datetimes are emitted in the same ``...Z``
+form Pydantic produces for UTC values.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Type
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - listed in requirements.txt
+    orjson = None
+
+_defaults_cache: Dict[type, Dict[str, Any]] = {}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def model_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection returning exactly the model's fields"""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+def model_defaults(model: Type[BaseModel]) -> Dict[str, Any]:
+    defaults = _defaults_cache.get(model)
+    if defaults is None:
+        defaults = {
+            name: field.default
+            for name, field in model.model_fields.items()
+            if field.default is not PydanticUndefined
+        }
+        _defaults_cache[model] = defaults
+    return defaults
+
+
+def trusted_documents(model: Type[BaseModel], docs: Iterable[Dict]) -> List[Dict]:
+    """Fill in model defaults for documents this API wrote itself, without re-validating them"""
+    defaults = model_defaults(model)
+    return [{**defaults, **doc} for doc in docs]
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
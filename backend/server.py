@@ -1,6 +1,7 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, Query, BackgroundTasks, Header
+from fastapi.responses import RedirectResponse, StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -12,41 +13,132 @@ from typing import List, Optional, Dict
 import uuid
 from datetime import datetime, timezone
 import jwt
+import asyncio
+import json
+import base64
+import re
+import hashlib
+import importlib
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
 import shutil
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+import tempfile
+import time
+from admission import AdmissionMiddleware, create_rate_limit_store
+from auth import AdminAuth, InvalidToken
+from catalog_cache import CatalogCache
+from indexes import ensure_indexes, describe_indexes
+from media import MediaFiles
+from storage import content_key, create_storage
+from uploads import MalformedUpload, UploadTooLarge, check_content_length, limit_body, read_file_field
+from image_variants import SKIPPED_EXTENSIONS, create_pool, run_generate_variants, pick_variant
+from payments import create_payment_client
+from coalescing import SingleFlight, TTLCache
+from webhook_queue import WebhookQueue
+from migrations import run_migrations
+from serialization import FastJSONResponse, dumps, model_projection, trusted_documents
+from search_index import ProductSearchIndex
+from bulk_io import (
+    IMPORT_BATCH_SIZE, PRODUCT_CSV_FIELDS, iter_lines, iter_ndjson_rows, iter_csv_rows,
+    stream_export, write_import_batch, add_import_error
+)
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from analytics import DIMENSIONS, record_sales, query_rollups, rebuild_rollups
+import inventory
+from metrics import (
+    MetricsMiddleware, MongoCommandMetrics, StackSampler, render_metrics, startup_duration, upload_bytes, upload_duration
+)
+from settings import Settings
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Create uploads directories
-UPLOAD_DIR = ROOT_DIR / "uploads"
-IMAGES_DIR = UPLOAD_DIR / "images"
-VIDEOS_DIR = UPLOAD_DIR / "videos"
-IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 # JWT Secret
 JWT_SECRET = os.environ.get('JWT_SECRET', 'bklyn-garment-secret-2020')
 
-# Stripe API Key
-STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY', '')
+# Metrics scraping token (unauthenticated when unset)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
 
 # Get backend URL for generating file URLs
 BACKEND_URL = os.environ.get('BACKEND_URL', '')
 
-# Create the main app
-app = FastAPI(title="The Bklyn Garment Gallery API")
+CHECKOUT_STATUS_TTL = float(os.environ.get('CHECKOUT_STATUS_TTL', '2'))
+CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '512'))
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '30'))
+STOREFRONT_SECTION_LIMIT = int(os.environ.get('STOREFRONT_SECTION_LIMIT', '12'))
+SEARCH_INDEX_REFRESH = float(os.environ.get('SEARCH_INDEX_REFRESH', '300'))
+
+# Checkout stock holds and how often lapsed ones are returned to stock
+RESERVATION_TTL = float(os.environ.get('RESERVATION_TTL', '1800'))
+RESERVATION_SWEEP_INTERVAL = float(os.environ.get('RESERVATION_SWEEP_INTERVAL', '60'))
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 security = HTTPBearer()
 
+# ============ APP RESOURCES ============
+
+class Resources:
+    """Everything one app instance connects to or caches, kept on ``app.state.resources``
+
+    Built by create_app(); nothing connects until the lifespan starts. Handlers
+    reach it through the ``get_resources`` dependency and background work is
+    handed it explicitly, so two apps in one process share no state.
+    """
+    
+    def __init__(self, settings: Settings, client=None):
+        self.settings = settings
+        # MongoDB connection and media storage (local disk by default, or S3-compatible)
+        self.client = client or AsyncIOMotorClient(settings.mongo_url, tz_aware=True, event_listeners=[MongoCommandMetrics()])
+        self.db = self.client[settings.db_name]
+        self.storage = create_storage(settings.media_root)
+        self.admin_auth = AdminAuth(self.db, JWT_SECRET)
+        # Created by create_app() once the webhook handler can be bound to these resources
+        self.webhook_queue: Optional[WebhookQueue] = None
+        # Created (and the Stripe SDK imported) on first use or by prewarm
+        self.payment_client = None
+        # Image variant workers, started on the first upload that needs them
+        self.image_pool: Optional[ProcessPoolExecutor] = None
+        self.profiler: Optional[StackSampler] = None
+        
+        # Concurrent checkouts sharing an Idempotency-Key (double-clicked Pay) share one attempt
+        self.checkout_flight = SingleFlight()
+        # Coalesce order-success page polling of Stripe checkout status
+        self.checkout_status_flight = SingleFlight()
+        self.checkout_status_cache = TTLCache(ttl=CHECKOUT_STATUS_TTL)
+        # Catalog snapshot cache (invalidated by admin product writes)
+        self.catalog_cache = CatalogCache(max_entries=CATALOG_CACHE_MAX_ENTRIES, ttl=CATALOG_CACHE_TTL)
+        # Home page snapshot, rebuilt once per catalog change however many requests miss at once
+        self.storefront_flight = SingleFlight()
+        # In-process product search index, kept in sync by the product write routes
+        self.search_index = ProductSearchIndex()
+        # The loop only keeps weak references to tasks, so background work is held here until done
+        self.tasks = set()
+    
+    def get_payment_client(self):
+        """The payment client; the payment SDKs are only imported when it is first needed"""
+        if self.payment_client is None:
+            self.payment_client = create_payment_client()
+        return self.payment_client
+    
+    def get_image_pool(self) -> ProcessPoolExecutor:
+        if self.image_pool is None:
+            self.image_pool = create_pool()
+        return self.image_pool
+    
+    def spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+def get_resources(request: Request) -> Resources:
+    return request.app.state.resources
+
 # ============ MODELS ============
 
 class AdminLogin(BaseModel):
@@ -57,6 +149,15 @@ class TokenResponse(BaseModel):
     token: str
     message: str
 
+class ImageVariant(BaseModel):
+    source: str
+    name: str
+    width: int
+    height: int
+    format: str  # webp, jpeg
+    url: str
+    bytes: int = 0
+
 class Product(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -72,6 +173,7 @@ class Product(BaseModel):
     featured: bool = False
     new_arrival: bool = False
     in_stock: bool = True
+    image_variants: List[ImageVariant] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ProductCreate(BaseModel):
@@ -107,6 +209,7 @@ class LookbookItem(BaseModel):
     title: str
     image_url: str
     description: str = ""
+    image_variants: List[ImageVariant] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class LookbookCreate(BaseModel):
@@ -130,6 +233,14 @@ class VideoCreate(BaseModel):
     description: str = ""
     active: bool = True
 
+class StockLevel(BaseModel):
+    size: str
+    color: str = ""
+    available: int = Field(ge=0)
+
+class InventoryUpdate(BaseModel):
+    stock: List[StockLevel]
+
 # ============ ORDER & PAYMENT MODELS ============
 
 class OrderItem(BaseModel):
@@ -154,6 +265,10 @@ class Order(BaseModel):
     shipping_address: Dict = {}
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Checkout and payment bookkeeping stored on orders that no API response exposes
+ORDER_INTERNAL_FIELDS = ("idempotency_key", "checkout_fingerprint", "checkout_url", "paid_batch")
+ADMIN_ORDER_PROJECTION = {"_id": 0, **{field: 0 for field in ORDER_INTERNAL_FIELDS}}
+
 class CheckoutRequest(BaseModel):
     items: List[OrderItem]
     origin_url: str
@@ -173,230 +288,542 @@ class PaymentTransaction(BaseModel):
 
 # ============ AUTH HELPERS ============
 
-ADMIN_USERNAME = "admin"
-ADMIN_PASSWORD = "admin123"
-
-def create_token(username: str) -> str:
-    payload = {
-        "username": username,
-        "exp": datetime.now(timezone.utc).timestamp() + 86400  # 24 hours
-    }
-    return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
-
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def verify_token(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    resources: Resources = Depends(get_resources)
+):
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return payload
+        return await resources.admin_auth.verify(credentials.credentials)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
+    except (jwt.InvalidTokenError, InvalidToken):
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# ============ PAGINATION HELPERS ============
+
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["created_at"].isoformat(), doc.get("id")]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, last_id = json.loads(raw)
+        return [datetime.fromisoformat(created_at), last_id]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def build_projection(fields: Optional[str], model: type) -> Dict:
+    """Turn a comma-separated ``fields`` parameter into a Mongo projection"""
+    projection = {"_id": 0}
+    if not fields:
+        return projection
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # id and created_at are always needed to build the next cursor
+    for field in requested | {"id", "created_at"}:
+        projection[field] = 1
+    return projection
+
+async def fetch_page(collection, query: Dict, projection: Dict, limit: int, cursor: Optional[str]):
+    """Keyset-paginate a collection newest first on (created_at, id)"""
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": last_id}}
+        ]}]}
+    docs = await collection.find(query, projection).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
 # ============ AUTH ROUTES ============
 
 @api_router.post("/admin/login", response_model=TokenResponse)
-async def admin_login(login: AdminLogin):
-    if login.username == ADMIN_USERNAME and login.password == ADMIN_PASSWORD:
-        token = create_token(login.username)
-        return TokenResponse(token=token, message="Login successful")
-    raise HTTPException(status_code=401, detail="Invalid credentials")
+async def admin_login(login: AdminLogin, resources: Resources = Depends(get_resources)):
+    user = await resources.admin_auth.authenticate(login.username, login.password)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return TokenResponse(token=resources.admin_auth.create_token(user["username"]), message="Login successful")
+
+@api_router.post("/admin/logout")
+async def admin_logout(payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    await resources.admin_auth.revoke(payload)
+    return {"message": "Logged out"}
 
 @api_router.get("/admin/verify")
 async def verify_admin(payload: dict = Depends(verify_token)):
     return {"valid": True, "username": payload.get("username")}
 
+@api_router.get("/admin/analytics")
+async def get_analytics(
+    start: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    dimension: str = "total",
+    payload: dict = Depends(verify_token),
+    resources: Resources = Depends(get_resources)
+):
+    """Revenue, units and order counts per day for a date range, from the sales rollups (admin only)"""
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of: {', '.join(DIMENSIONS)}")
+    return await query_rollups(resources.db, dimension, start, end)
+
+@api_router.post("/admin/analytics/rebuild")
+async def rebuild_analytics(payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    """Recompute the sales rollups from all paid orders (admin only)"""
+    count = await rebuild_rollups(resources.db)
+    return {"message": "Sales rollups rebuilt", "documents": count}
+
+@api_router.get("/admin/indexes")
+async def get_indexes(payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    """Report existing and missing MongoDB indexes per collection (admin only)"""
+    return await describe_indexes(resources.db)
+
 # ============ PRODUCT ROUTES ============
 
 @api_router.get("/products", response_model=List[Product])
-async def get_products(category: Optional[str] = None, featured: Optional[bool] = None, new_arrival: Optional[bool] = None):
-    query = {}
-    if category:
-        query["category"] = category
-    if featured is not None:
-        query["featured"] = featured
-    if new_arrival is not None:
-        query["new_arrival"] = new_arrival
-    
-    products = await db.products.find(query, {"_id": 0}).to_list(1000)
-    for p in products:
-        if isinstance(p.get('created_at'), str):
-            p['created_at'] = datetime.fromisoformat(p['created_at'])
-    return products
+async def get_products(
+    request: Request,
+    category: Optional[str] = None,
+    featured: Optional[bool] = None,
+    new_arrival: Optional[bool] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    resources: Resources = Depends(get_resources)
+):
+    """List products newest first; the next page's cursor is returned in X-Next-Cursor"""
+    catalog_cache = resources.catalog_cache
+    cache_key = ("products", category, featured, new_arrival, limit, cursor, fields)
+    entry = catalog_cache.get(cache_key)
+    if entry is None:
+        version = catalog_cache.version
+        query = {}
+        if category:
+            query["category"] = category
+        if featured is not None:
+            query["featured"] = featured
+        if new_arrival is not None:
+            query["new_arrival"] = new_arrival
+        
+        projection = build_projection(fields, Product) if fields else model_projection(Product)
+        products, next_cursor = await fetch_page(resources.db.products, query, projection, limit, cursor)
+        content = products if fields else trusted_documents(Product, products)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        entry = catalog_cache.put(cache_key, content, version, headers)
+    return catalog_cache.respond(request, entry)
+
+async def rebuild_search_index(resources: Resources):
+    products = await resources.db.products.find({}, model_projection(Product)).to_list(None)
+    resources.search_index.build(trusted_documents(Product, products))
+    logger.info(f"Search index built with {len(resources.search_index)} products")
+
+async def refresh_search_index_periodically(resources: Resources):
+    """Rebuild the index now and then to pick up writes handled by other workers"""
+    while True:
+        await asyncio.sleep(SEARCH_INDEX_REFRESH)
+        try:
+            await rebuild_search_index(resources)
+        except Exception as e:
+            logger.error(f"Search index refresh failed: {e}")
+
+@api_router.get("/products/search")
+async def search_products(
+    q: str = "",
+    category: Optional[str] = None,
+    color: Optional[str] = None,
+    size: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: int = Query(24, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    resources: Resources = Depends(get_resources)
+):
+    """Full-text product search with facet counts for category, color, size and price"""
+    return FastJSONResponse(resources.search_index.search(
+        q,
+        category=category,
+        color=color,
+        size=size,
+        min_price=min_price,
+        max_price=max_price,
+        limit=limit,
+        offset=offset
+    ))
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+@api_router.post("/products/import")
+async def import_products(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    payload: dict = Depends(verify_token),
+    resources: Resources = Depends(get_resources)
+):
+    """Bulk upsert products from a streamed NDJSON or CSV body (admin only)
+    
+    Rows with an ``id`` update that product (or create it under that id); rows without one are inserted.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    lines = iter_lines(request.stream())
+    rows = iter_csv_rows(lines) if format == "csv" else iter_ndjson_rows(lines)
+    
+    report = {"inserted": 0, "updated": 0, "error_count": 0, "errors": []}
+    batch = []
+    async for line_no, row in rows:
+        if isinstance(row, Exception):
+            add_import_error(report, line_no, str(row))
+            continue
+        try:
+            product = ProductCreate(**row)
+        except ValueError as e:
+            add_import_error(report, line_no, str(e))
+            continue
+        
+        product_id = row.get("id")
+        if product_id:
+            op = UpdateOne(
+                {"id": str(product_id)},
+                {
+                    "$set": product.model_dump(),
+                    "$setOnInsert": {"id": str(product_id), "image_variants": [], "created_at": datetime.now(timezone.utc)}
+                },
+                upsert=True
+            )
+        else:
+            op = InsertOne(Product(**product.model_dump()).model_dump())
+        batch.append((line_no, op))
+        
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await write_import_batch(resources.db.products, batch, report)
+            batch = []
+    if batch:
+        await write_import_batch(resources.db.products, batch, report)
+    
+    if report["inserted"] or report["updated"]:
+        invalidate_catalog(resources)
+        await rebuild_search_index(resources)
+    return report
+
+@api_router.get("/products/export")
+async def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    payload: dict = Depends(verify_token),
+    resources: Resources = Depends(get_resources)
+):
+    """Stream every product as NDJSON or CSV (admin only)"""
+    cursor = resources.db.products.find({}, model_projection(Product)).sort([("created_at", -1), ("id", -1)]).batch_size(IMPORT_BATCH_SIZE)
+    return StreamingResponse(
+        stream_export(cursor, format, PRODUCT_CSV_FIELDS),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
+async def get_product(product_id: str, request: Request, resources: Resources = Depends(get_resources)):
+    catalog_cache = resources.catalog_cache
+    cache_key = ("product", product_id)
+    entry = catalog_cache.get(cache_key)
+    if entry is None:
+        version = catalog_cache.version
+        product = await resources.db.products.find_one({"id": product_id}, model_projection(Product))
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        entry = catalog_cache.put(cache_key, trusted_documents(Product, [product])[0], version)
+    return catalog_cache.respond(request, entry)
+
+@api_router.get("/products/{product_id}/inventory")
+async def get_product_inventory(product_id: str, resources: Resources = Depends(get_resources)):
+    """Stock per size/color; an empty list means the product is not stock-tracked"""
+    return {"product_id": product_id, "stock": await inventory.stock_levels(resources.db, product_id)}
+
+@api_router.put("/products/{product_id}/inventory")
+async def set_product_inventory(
+    product_id: str,
+    update: InventoryUpdate,
+    payload: dict = Depends(verify_token),
+    resources: Resources = Depends(get_resources)
+):
+    db = resources.db
+    if not await db.products.find_one({"id": product_id}, {"_id": 0, "id": 1}):
         raise HTTPException(status_code=404, detail="Product not found")
-    if isinstance(product.get('created_at'), str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
-    return product
+    if update.stock:
+        await inventory.set_stock(db, product_id, [level.model_dump() for level in update.stock])
+    return {"product_id": product_id, "stock": await inventory.stock_levels(db, product_id)}
 
 @api_router.post("/products", response_model=Product)
-async def create_product(product: ProductCreate, payload: dict = Depends(verify_token)):
-    product_obj = Product(**product.model_dump())
-    doc = product_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.products.insert_one(doc)
+async def create_product(product: ProductCreate, payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    image_variants = await lookup_image_variants(resources.db, [product.image_url, *product.images])
+    product_obj = Product(**product.model_dump(), image_variants=image_variants)
+    await resources.db.products.insert_one(product_obj.model_dump())
+    invalidate_catalog(resources)
+    resources.search_index.upsert(product_obj.model_dump())
     return product_obj
 
 @api_router.put("/products/{product_id}", response_model=Product)
-async def update_product(product_id: str, product: ProductUpdate, payload: dict = Depends(verify_token)):
+async def update_product(
+    product_id: str,
+    product: ProductUpdate,
+    payload: dict = Depends(verify_token),
+    resources: Resources = Depends(get_resources)
+):
+    db = resources.db
     update_data = {k: v for k, v in product.model_dump().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
     
+    if "image_url" in update_data or "images" in update_data:
+        current = await db.products.find_one({"id": product_id}, {"_id": 0, "image_url": 1, "images": 1}) or {}
+        image_url = update_data.get("image_url", current.get("image_url", ""))
+        images = update_data.get("images", current.get("images", []))
+        update_data["image_variants"] = await lookup_image_variants(db, [image_url, *images])
+    
     result = await db.products.update_one({"id": product_id}, {"$set": update_data})
+    invalidate_catalog(resources)
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    updated = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if isinstance(updated.get('created_at'), str):
-        updated['created_at'] = datetime.fromisoformat(updated['created_at'])
+    updated = await db.products.find_one({"id": product_id}, model_projection(Product))
+    resources.search_index.upsert(trusted_documents(Product, [updated])[0])
     return updated
 
 @api_router.delete("/products/{product_id}")
-async def delete_product(product_id: str, payload: dict = Depends(verify_token)):
-    result = await db.products.delete_one({"id": product_id})
+async def delete_product(product_id: str, payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    result = await resources.db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await resources.db.inventory.delete_many({"product_id": product_id})
+    invalidate_catalog(resources)
+    resources.search_index.remove(product_id)
     return {"message": "Product deleted successfully"}
 
 # ============ LOOKBOOK ROUTES ============
 
 @api_router.get("/lookbook", response_model=List[LookbookItem])
-async def get_lookbook():
-    items = await db.lookbook.find({}, {"_id": 0}).to_list(100)
-    for item in items:
-        if isinstance(item.get('created_at'), str):
-            item['created_at'] = datetime.fromisoformat(item['created_at'])
-    return items
+async def get_lookbook(resources: Resources = Depends(get_resources)):
+    items = await resources.db.lookbook.find({}, model_projection(LookbookItem)).to_list(100)
+    return FastJSONResponse(trusted_documents(LookbookItem, items))
 
 @api_router.post("/lookbook", response_model=LookbookItem)
-async def create_lookbook_item(item: LookbookCreate, payload: dict = Depends(verify_token)):
-    lookbook_obj = LookbookItem(**item.model_dump())
-    doc = lookbook_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.lookbook.insert_one(doc)
+async def create_lookbook_item(item: LookbookCreate, payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    image_variants = await lookup_image_variants(resources.db, [item.image_url])
+    lookbook_obj = LookbookItem(**item.model_dump(), image_variants=image_variants)
+    await resources.db.lookbook.insert_one(lookbook_obj.model_dump())
+    invalidate_catalog(resources)
     return lookbook_obj
 
 @api_router.delete("/lookbook/{item_id}")
-async def delete_lookbook_item(item_id: str, payload: dict = Depends(verify_token)):
-    result = await db.lookbook.delete_one({"id": item_id})
+async def delete_lookbook_item(item_id: str, payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    result = await resources.db.lookbook.delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Lookbook item not found")
+    invalidate_catalog(resources)
     return {"message": "Lookbook item deleted successfully"}
 
 # ============ CATEGORIES ============
 
+CATEGORIES = [
+    {"id": "tees", "name": "Tees", "description": "Premium cotton tees"},
+    {"id": "hoodies", "name": "Hoodies", "description": "Cozy streetwear hoodies"},
+    {"id": "sweats", "name": "Sweats", "description": "Comfortable sweatpants"},
+    {"id": "hats", "name": "Hats", "description": "Caps and beanies"},
+    {"id": "accessories", "name": "Accessories", "description": "Bags, jewelry & more"}
+]
+
+async def categories_with_counts(db) -> List[dict]:
+    counts = await db.products.aggregate([{"$group": {"_id": "$category", "count": {"$sum": 1}}}]).to_list(None)
+    by_category = {c["_id"]: c["count"] for c in counts}
+    return [{**category, "product_count": by_category.get(category["id"], 0)} for category in CATEGORIES]
+
 @api_router.get("/categories")
-async def get_categories():
-    return {
-        "categories": [
-            {"id": "tees", "name": "Tees", "description": "Premium cotton tees"},
-            {"id": "hoodies", "name": "Hoodies", "description": "Cozy streetwear hoodies"},
-            {"id": "sweats", "name": "Sweats", "description": "Comfortable sweatpants"},
-            {"id": "hats", "name": "Hats", "description": "Caps and beanies"},
-            {"id": "accessories", "name": "Accessories", "description": "Bags, jewelry & more"}
-        ]
-    }
+async def get_categories(request: Request, resources: Resources = Depends(get_resources)):
+    catalog_cache = resources.catalog_cache
+    entry = catalog_cache.get(("categories",))
+    if entry is None:
+        version = catalog_cache.version
+        entry = catalog_cache.put(("categories",), {"categories": await categories_with_counts(resources.db)}, version)
+    return catalog_cache.respond(request, entry)
 
 # ============ VIDEO ROUTES ============
 
 @api_router.get("/videos", response_model=List[Video])
-async def get_videos(active_only: bool = True):
+async def get_videos(active_only: bool = True, resources: Resources = Depends(get_resources)):
     query = {"active": True} if active_only else {}
-    videos = await db.videos.find(query, {"_id": 0}).to_list(100)
-    for video in videos:
-        if isinstance(video.get('created_at'), str):
-            video['created_at'] = datetime.fromisoformat(video['created_at'])
-    return videos
+    videos = await resources.db.videos.find(query, model_projection(Video)).to_list(100)
+    return FastJSONResponse(trusted_documents(Video, videos))
 
 @api_router.post("/videos", response_model=Video)
-async def create_video(video: VideoCreate, payload: dict = Depends(verify_token)):
+async def create_video(video: VideoCreate, payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
     video_obj = Video(**video.model_dump())
-    doc = video_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.videos.insert_one(doc)
+    await resources.db.videos.insert_one(video_obj.model_dump())
+    invalidate_catalog(resources)
     return video_obj
 
 @api_router.delete("/videos/{video_id}")
-async def delete_video(video_id: str, payload: dict = Depends(verify_token)):
-    result = await db.videos.delete_one({"id": video_id})
+async def delete_video(video_id: str, payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    result = await resources.db.videos.delete_one({"id": video_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Video not found")
+    invalidate_catalog(resources)
     return {"message": "Video deleted successfully"}
 
+# ============ STOREFRONT ============
+
+async def build_storefront(db) -> dict:
+    """Every home page section in one snapshot, queried concurrently"""
+    product_projection = model_projection(Product)
+    featured, new_arrivals, lookbook, videos, categories = await asyncio.gather(
+        db.products.find({"featured": True}, product_projection)
+            .sort([("created_at", -1), ("id", -1)]).to_list(STOREFRONT_SECTION_LIMIT),
+        db.products.find({"new_arrival": True}, product_projection)
+            .sort([("created_at", -1), ("id", -1)]).to_list(STOREFRONT_SECTION_LIMIT),
+        db.lookbook.find({}, model_projection(LookbookItem)).to_list(100),
+        db.videos.find({"active": True}, model_projection(Video)).to_list(100),
+        categories_with_counts(db),
+    )
+    return {
+        "featured": trusted_documents(Product, featured),
+        "new_arrivals": trusted_documents(Product, new_arrivals),
+        "lookbook": trusted_documents(LookbookItem, lookbook),
+        "videos": trusted_documents(Video, videos),
+        "categories": categories,
+    }
+
+async def build_storefront_entry(resources: Resources):
+    version = resources.catalog_cache.version
+    return resources.catalog_cache.put(("storefront",), await build_storefront(resources.db), version)
+
+async def storefront_entry(resources: Resources):
+    return await resources.storefront_flight.do(
+        resources.catalog_cache.version, lambda: build_storefront_entry(resources)
+    )
+
+async def refresh_storefront(resources: Resources):
+    try:
+        await storefront_entry(resources)
+    except Exception as e:
+        logging.error(f"Storefront refresh failed: {e}")
+
+def invalidate_catalog(resources: Resources):
+    """Drop every catalog snapshot and rebuild the storefront one in the background"""
+    resources.catalog_cache.invalidate()
+    resources.spawn(refresh_storefront(resources))
+
+@api_router.get("/storefront")
+async def get_storefront(request: Request, resources: Resources = Depends(get_resources)):
+    """Featured products, new arrivals, lookbook, active videos and category counts in one response"""
+    entry = resources.catalog_cache.get(("storefront",))
+    if entry is None:
+        entry = await storefront_entry(resources)
+    return resources.catalog_cache.respond(request, entry)
+
 # ============ STRIPE PAYMENT ROUTES ============
 
-@api_router.post("/checkout")
-async def create_checkout(checkout_req: CheckoutRequest, request: Request):
-    """Create a Stripe checkout session for cart items"""
-    if not checkout_req.items:
-        raise HTTPException(status_code=400, detail="Cart is empty")
+async def find_checkout(db, idempotency_key: str, fingerprint: str) -> Optional[dict]:
+    order = await db.orders.find_one(
+        {"idempotency_key": idempotency_key},
+        {"_id": 0, "id": 1, "session_id": 1, "checkout_url": 1, "checkout_fingerprint": 1}
+    )
+    if order is None:
+        return None
+    if order.get("checkout_fingerprint") != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different cart")
+    return {"checkout_url": order.get("checkout_url"), "session_id": order["session_id"], "order_id": order["id"]}
+
+def checkout_fingerprint(checkout_req: CheckoutRequest) -> str:
+    return hashlib.sha256(dumps(checkout_req.model_dump())).hexdigest()
+
+async def start_checkout(
+    resources: Resources,
+    checkout_req: CheckoutRequest,
+    base_url: str,
+    idempotency_key: Optional[str],
+    fingerprint: Optional[str] = None
+) -> dict:
+    db = resources.db
+    if idempotency_key:
+        fingerprint = fingerprint or checkout_fingerprint(checkout_req)
+        existing = await find_checkout(db, idempotency_key, fingerprint)
+        if existing is not None:
+            return existing
     
     # Calculate total from server-side product prices (security)
     total = 0.0
     verified_items = []
     
+    # Fetch every cart product's price in a single round trip
+    product_ids = list({item.product_id for item in checkout_req.items})
+    products = await db.products.find(
+        {"id": {"$in": product_ids}},
+        {"_id": 0, "id": 1, "price": 1}
+    ).to_list(len(product_ids))
+    prices = {p['id']: float(p['price']) for p in products}
+    
     for item in checkout_req.items:
-        # Get product from database to verify price
-        product = await db.products.find_one({"id": item.product_id}, {"_id": 0})
-        if product:
-            item_total = float(product['price']) * item.quantity
-            total += item_total
-            verified_items.append({
-                **item.model_dump(),
-                "price": float(product['price'])  # Use server-side price
-            })
-        else:
+        price = prices.get(item.product_id)
+        if price is None:
             raise HTTPException(status_code=400, detail=f"Product {item.product_id} not found")
+        if item.quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+        total += price * item.quantity
+        verified_items.append({
+            **item.model_dump(),
+            "price": price  # Use server-side price
+        })
     
-    # Create order in database
+    # Hold stock before talking to Stripe; concurrent buyers of the last units race atomically in MongoDB
     order_id = str(uuid.uuid4())
-    order = {
-        "id": order_id,
-        "items": verified_items,
-        "total": total,
-        "status": "pending",
-        "payment_status": "pending",
-        "session_id": "",
-        "customer_email": "",
-        "shipping_address": {},
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.orders.insert_one(order)
+    try:
+        await inventory.reserve(db, order_id, verified_items, RESERVATION_TTL)
+    except inventory.OutOfStock as e:
+        name = next(item.name for item in checkout_req.items if item.product_id == e.product_id)
+        variant = f"{e.size} {e.color}".strip()
+        raise HTTPException(status_code=409, detail=f"{name} ({variant}) is out of stock")
     
     # Build URLs
     success_url = f"{checkout_req.origin_url}/order-success?session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{checkout_req.origin_url}/cart"
     
-    # Create Stripe checkout session
-    host_url = str(request.base_url)
-    webhook_url = f"{host_url}api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
-    checkout_request = CheckoutSessionRequest(
-        amount=total,
-        currency="usd",
-        success_url=success_url,
-        cancel_url=cancel_url,
-        metadata={
+    # Create Stripe checkout session; the payment client turns these fields into its SDK's request type
+    checkout_request = {
+        "amount": total,
+        "currency": "usd",
+        "success_url": success_url,
+        "cancel_url": cancel_url,
+        "metadata": {
             "order_id": order_id,
             "source": "bklyn_garment_gallery"
         }
-    )
-    
-    session = await stripe_checkout.create_checkout_session(checkout_request)
+    }
     
-    # Update order with session ID
-    await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"session_id": session.session_id}}
-    )
+    try:
+        session = await resources.get_payment_client().create_checkout_session(checkout_request, base_url)
+    except Exception:
+        await inventory.release_orders(db, [order_id])
+        raise
     
-    # Create payment transaction record
+    # Write the order and its payment transaction together, once the session exists
+    now = datetime.now(timezone.utc)
+    order = {
+        "id": order_id,
+        "items": verified_items,
+        "total": total,
+        "status": "pending",
+        "payment_status": "pending",
+        "session_id": session.session_id,
+        "checkout_url": session.url,
+        "customer_email": "",
+        "shipping_address": {},
+        "created_at": now
+    }
+    if idempotency_key:
+        order["idempotency_key"] = idempotency_key
+        order["checkout_fingerprint"] = fingerprint
     transaction = {
         "id": str(uuid.uuid4()),
         "session_id": session.session_id,
@@ -406,41 +833,124 @@ async def create_checkout(checkout_req: CheckoutRequest, request: Request):
         "status": "pending",
         "payment_status": "pending",
         "metadata": {"order_id": order_id},
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": now
     }
-    await db.payment_transactions.insert_one(transaction)
+    order_result, transaction_result = await asyncio.gather(
+        db.orders.insert_one(order),
+        db.payment_transactions.insert_one(transaction),
+        return_exceptions=True
+    )
+    if isinstance(order_result, DuplicateKeyError) and idempotency_key:
+        # Another worker won the race for this key: drop this attempt and answer with theirs
+        await asyncio.gather(
+            db.payment_transactions.delete_one({"session_id": session.session_id}),
+            inventory.release_orders(db, [order_id])
+        )
+        return await find_checkout(db, idempotency_key, fingerprint)
+    failure = next((r for r in (order_result, transaction_result) if isinstance(r, BaseException)), None)
+    if failure is not None:
+        # The two inserts are not atomic: undo whichever one landed and give the held stock back
+        rollback = [inventory.release_orders(db, [order_id])]
+        if not isinstance(order_result, BaseException):
+            rollback.append(db.orders.delete_one({"id": order_id}))
+        if not isinstance(transaction_result, BaseException):
+            rollback.append(db.payment_transactions.delete_one({"id": transaction["id"]}))
+        await asyncio.gather(*rollback, return_exceptions=True)
+        raise failure
     
     return {"checkout_url": session.url, "session_id": session.session_id, "order_id": order_id}
 
-@api_router.get("/checkout/status/{session_id}")
-async def get_checkout_status(session_id: str, request: Request):
-    """Get the status of a checkout session"""
-    host_url = str(request.base_url)
-    webhook_url = f"{host_url}api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+@api_router.post("/checkout")
+async def create_checkout(
+    checkout_req: CheckoutRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    resources: Resources = Depends(get_resources)
+):
+    """Create a Stripe checkout session for cart items; repeats of an Idempotency-Key return the original session"""
+    if not checkout_req.items:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    if not idempotency_key:
+        return await start_checkout(resources, checkout_req, str(request.base_url), None)
+    # Only identical carts share a flight; a reused key with another cart still gets its 422
+    fingerprint = checkout_fingerprint(checkout_req)
+    return await resources.checkout_flight.do(
+        (idempotency_key, fingerprint),
+        lambda: start_checkout(resources, checkout_req, str(request.base_url), idempotency_key, fingerprint)
+    )
+
+TERMINAL_CHECKOUT_STATUSES = {"expired"}
+
+async def mark_sessions_paid(resources: Resources, session_ids: List[str], fields: Optional[Dict] = None) -> int:
+    """Record paid checkout sessions and roll up the orders this call flipped to paid"""
+    db = resources.db
+    await db.payment_transactions.update_many(
+        {"session_id": {"$in": session_ids}, "payment_status": {"$ne": "paid"}},
+        {"$set": {"status": "complete", "payment_status": "paid", **(fields or {})}}
+    )
+    # Tag the flipped orders so exactly those are counted once in the sales rollups
+    paid_batch = str(uuid.uuid4())
+    result = await db.orders.update_many(
+        {"session_id": {"$in": session_ids}, "payment_status": {"$ne": "paid"}},
+        {"$set": {"status": "paid", "payment_status": "paid", "paid_at": datetime.now(timezone.utc), "paid_batch": paid_batch}}
+    )
+    if result.modified_count:
+        orders = await db.orders.find(
+            {"paid_batch": paid_batch},
+            {"_id": 0, "id": 1, "items": 1, "total": 1, "paid_at": 1}
+        ).to_list(None)
+        shortfall = await inventory.convert(db, [o["id"] for o in orders])
+        if shortfall:
+            logging.error(f"Paid orders without stock after their reservation lapsed: {shortfall}")
+            await db.orders.update_many({"id": {"$in": shortfall}}, {"$set": {"inventory_shortfall": True}})
+        await record_sales(db, orders)
+    for session_id in session_ids:
+        resources.checkout_status_cache.pop(session_id)
+    return result.modified_count
+
+async def release_sessions(db, session_ids: List[str]) -> int:
+    """Return the stock held by abandoned checkout sessions"""
+    orders = await db.orders.find({"session_id": {"$in": session_ids}}, {"_id": 0, "id": 1}).to_list(None)
+    return await inventory.release_orders(db, [o["id"] for o in orders])
+
+async def release_expired_reservations_periodically(db):
+    """Give back stock held by checkouts that were never completed"""
+    while True:
+        await asyncio.sleep(RESERVATION_SWEEP_INTERVAL)
+        try:
+            released = await inventory.release_expired(db)
+            if released:
+                logger.info(f"Released {released} expired stock reservations")
+        except Exception as e:
+            logger.error(f"Reservation sweep failed: {e}")
+
+async def refresh_checkout_status(resources: Resources, session_id: str, base_url: str) -> dict:
+    # Terminal sessions are answered from our own records without calling Stripe
+    db = resources.db
+    transaction = await db.payment_transactions.find_one(
+        {"session_id": session_id},
+        {"_id": 0, "status": 1, "payment_status": 1, "amount": 1, "amount_total": 1, "currency": 1}
+    )
+    if transaction and (transaction.get("payment_status") == "paid" or transaction.get("status") in TERMINAL_CHECKOUT_STATUSES):
+        return {
+            "status": transaction.get("status"),
+            "payment_status": transaction.get("payment_status"),
+            "amount_total": transaction.get("amount_total", round(transaction.get("amount", 0) * 100)),
+            "currency": transaction.get("currency", "usd")
+        }
     
-    status = await stripe_checkout.get_checkout_status(session_id)
+    status = await resources.get_payment_client().get_checkout_status(session_id, base_url)
+    recorded = {"amount_total": status.amount_total, "currency": status.currency}
     
     # Update order and transaction if payment is complete
     if status.payment_status == "paid":
-        # Check if already processed
-        existing = await db.payment_transactions.find_one({
-            "session_id": session_id,
-            "payment_status": "paid"
-        })
-        
-        if not existing:
-            # Update transaction
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {"$set": {"status": "complete", "payment_status": "paid"}}
-            )
-            
-            # Update order
-            await db.orders.update_one(
-                {"session_id": session_id},
-                {"$set": {"status": "paid", "payment_status": "paid"}}
-            )
+        await mark_sessions_paid(resources, [session_id], recorded)
+    elif status.status in TERMINAL_CHECKOUT_STATUSES:
+        await db.payment_transactions.update_one(
+            {"session_id": session_id},
+            {"$set": {"status": status.status, "payment_status": status.payment_status, **recorded}}
+        )
+        await release_sessions(db, [session_id])
     
     return {
         "status": status.status,
@@ -449,58 +959,98 @@ async def get_checkout_status(session_id: str, request: Request):
         "currency": status.currency
     }
 
+@api_router.get("/checkout/status/{session_id}")
+async def get_checkout_status(session_id: str, request: Request, resources: Resources = Depends(get_resources)):
+    """Get the status of a checkout session"""
+    cache = resources.checkout_status_cache
+    cached = cache.get(session_id)
+    if cached is not None:
+        return cached
+
+    async def refresh():
+        # A webhook applied while this refresh is in flight bumps the generation, so its answer is not cached
+        generation = cache.generation(session_id)
+        result = await refresh_checkout_status(resources, session_id, str(request.base_url))
+        cache.put(session_id, result, generation=generation)
+        return result
+
+    return await resources.checkout_status_flight.do(session_id, refresh)
+
+async def apply_webhook_events(resources: Resources, events: List[dict]):
+    """Apply a batch of queued Stripe webhook events with one write per collection"""
+    paid_sessions = list({e["session_id"] for e in events if e.get("payment_status") == "paid" and e.get("session_id")})
+    if paid_sessions:
+        await mark_sessions_paid(resources, paid_sessions)
+    expired_sessions = list({e["session_id"] for e in events if e.get("event_type") == "checkout.session.expired" and e.get("session_id")})
+    if expired_sessions:
+        await release_sessions(resources.db, expired_sessions)
+
 @api_router.post("/webhook/stripe")
-async def stripe_webhook(request: Request):
-    """Handle Stripe webhooks"""
+async def stripe_webhook(request: Request, resources: Resources = Depends(get_resources)):
+    """Verify a Stripe webhook and durably enqueue it; the webhook worker applies it"""
     body = await request.body()
     signature = request.headers.get("Stripe-Signature", "")
     
-    host_url = str(request.base_url)
-    webhook_url = f"{host_url}api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
     try:
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
-        
-        if webhook_response.payment_status == "paid":
-            session_id = webhook_response.session_id
-            
-            # Update transaction and order
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {"$set": {"status": "complete", "payment_status": "paid"}}
-            )
-            
-            await db.orders.update_one(
-                {"session_id": session_id},
-                {"$set": {"status": "paid", "payment_status": "paid"}}
-            )
-        
-        return {"status": "success"}
+        webhook_response = await resources.get_payment_client().handle_webhook(body, signature, str(request.base_url))
     except Exception as e:
         logging.error(f"Webhook error: {e}")
-        return {"status": "error", "message": str(e)}
+        raise HTTPException(status_code=400, detail="Invalid webhook")
+    
+    # A failed enqueue surfaces as a 5xx so Stripe retries delivery
+    await resources.webhook_queue.enqueue({
+        "event_id": getattr(webhook_response, "event_id", None) or hashlib.sha256(body).hexdigest(),
+        "event_type": getattr(webhook_response, "event_type", ""),
+        "session_id": webhook_response.session_id,
+        "payment_status": webhook_response.payment_status
+    })
+    return {"status": "success"}
 
 # ============ ORDER ROUTES ============
 
 @api_router.get("/orders")
-async def get_orders(payload: dict = Depends(verify_token)):
-    """Get all orders (admin only)"""
-    orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+async def get_orders(
+    response: Response,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    payload: dict = Depends(verify_token),
+    resources: Resources = Depends(get_resources)
+):
+    """Get orders newest first (admin only); the next page's cursor is returned in X-Next-Cursor"""
+    projection = build_projection(fields, Order) if fields else ADMIN_ORDER_PROJECTION
+    orders, next_cursor = await fetch_page(resources.db.orders, {}, projection, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return orders
 
+@api_router.get("/orders/export")
+async def export_orders(payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    """Stream every order as NDJSON (admin only)"""
+    cursor = resources.db.orders.find({}, ADMIN_ORDER_PROJECTION).sort([("created_at", -1), ("id", -1)]).batch_size(IMPORT_BATCH_SIZE)
+    return StreamingResponse(
+        stream_export(cursor, "ndjson"),
+        media_type=EXPORT_MEDIA_TYPES["ndjson"],
+        headers={"Content-Disposition": 'attachment; filename="orders.ndjson"'}
+    )
+
 @api_router.get("/orders/{order_id}")
-async def get_order(order_id: str):
-    """Get a specific order"""
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+async def get_order(order_id: str, resources: Resources = Depends(get_resources)):
+    """Get a specific order; public, so only the customer-facing Order fields are returned"""
+    order = await resources.db.orders.find_one({"id": order_id}, model_projection(Order))
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 @api_router.put("/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: str, payload: dict = Depends(verify_token)):
+async def update_order_status(
+    order_id: str,
+    status: str,
+    payload: dict = Depends(verify_token),
+    resources: Resources = Depends(get_resources)
+):
     """Update order status (admin only)"""
-    result = await db.orders.update_one(
+    result = await resources.db.orders.update_one(
         {"id": order_id},
         {"$set": {"status": status}}
     )
@@ -518,60 +1068,201 @@ async def root():
 async def health():
     return {"status": "healthy", "service": "bklyn-garment-gallery"}
 
+# ============ METRICS ROUTES ============
+
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus text exposition of request, database, payment and upload metrics"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/admin/profile")
+async def get_profile(reset: bool = False, payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    """Collapsed stacks sampled from the event loop thread, for flamegraph tools"""
+    profiler = resources.profiler
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiler disabled; set PROFILER_INTERVAL_MS")
+    body = profiler.collapsed()
+    if reset:
+        profiler.reset()
+    return PlainTextResponse(body)
+
+# ============ IMAGE VARIANTS ============
+
+UPLOADS_PREFIX = "/api/uploads/"
+
+def upload_path(url: str) -> str:
+    """``/api/uploads/...`` path of an uploaded file's URL, however it is written
+
+    The admin UI stores uploads as absolute ``{BACKEND_URL}/api/uploads/...`` URLs while
+    variants are keyed by the path, so every lookup goes through this.
+    """
+    path = urlsplit(url).path
+    return path if path.startswith(UPLOADS_PREFIX) else url
+
+async def lookup_image_variants(db, urls: List[str]) -> List[dict]:
+    """Collect the stored variants for a set of source image URLs"""
+    urls = list({upload_path(u) for u in urls if u})
+    if not urls:
+        return []
+    docs = await db.image_variants.find({"source": {"$in": urls}}, {"_id": 0}).to_list(len(urls))
+    return [{"source": d["source"], **v} for d in docs for v in d["variants"]]
+
+async def process_image_variants(resources: Resources, key: str, file_url: str):
+    """Generate variants for an uploaded image and attach them to documents already using it"""
+    db, storage = resources.db, resources.storage
+    # Content-addressed uploads repeat for identical files, whose variants already exist
+    if await db.image_variants.find_one({"source": file_url}, {"_id": 1}):
+        return
+    out_dir = Path(await run_in_threadpool(tempfile.mkdtemp, dir=storage.staging_dir))
+    try:
+        file_path = await storage.local_path(key)
+        variants = await run_generate_variants(resources.get_image_pool(), file_path, out_dir, "/api/uploads/images/variants")
+        for variant in variants:
+            filename = variant["url"].rsplit("/", 1)[-1]
+            await storage.put(f"images/variants/{filename}", out_dir / filename)
+    except Exception as e:
+        logger.error(f"Image variant generation failed for {file_url}: {e}")
+        return
+    finally:
+        await run_in_threadpool(shutil.rmtree, out_dir, True)
+    
+    await db.image_variants.update_one(
+        {"source": file_url},
+        {"$set": {"source": file_url, "variants": variants}},
+        upsert=True
+    )
+    
+    tagged = {"$addToSet": {"image_variants": {"$each": [{"source": file_url, **v} for v in variants]}}}
+    # Documents may reference the upload by its path or by an absolute URL on any host
+    referenced = {"$regex": f"^(https?://[^/]+)?{re.escape(file_url)}$"}
+    result = await db.products.update_many({"$or": [{"image_url": referenced}, {"images": referenced}]}, tagged)
+    await db.lookbook.update_many({"image_url": referenced}, tagged)
+    if result.modified_count:
+        invalidate_catalog(resources)
+
+@api_router.get("/images/variant")
+async def get_image_variant(
+    request: Request,
+    url: str,
+    width: int = Query(640, ge=1, le=4096),
+    format: Optional[str] = None,
+    resources: Resources = Depends(get_resources)
+):
+    """Redirect to the smallest stored variant of an uploaded image that covers the requested width"""
+    url = upload_path(url)
+    if not url.startswith(f"{UPLOADS_PREFIX}images/"):
+        raise HTTPException(status_code=400, detail="Only uploaded images have variants")
+    if format:
+        formats = [format]
+    elif "image/webp" in request.headers.get("accept", ""):
+        formats = ["webp", "jpeg"]
+    else:
+        formats = ["jpeg"]
+    
+    doc = await resources.db.image_variants.find_one({"source": url}, {"_id": 0})
+    variant = pick_variant(doc["variants"], width, formats) if doc else None
+    return RedirectResponse(
+        variant["url"] if variant else url,
+        status_code=307,
+        headers={"Vary": "Accept", "Cache-Control": "public, max-age=300"}
+    )
+
 # ============ FILE UPLOAD ENDPOINTS ============
 
 ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/jpg", "image/png", "image/webp", "image/gif"]
 ALLOWED_VIDEO_TYPES = ["video/mp4", "video/quicktime", "video/x-msvideo", "video/webm"]
 
-@api_router.post("/upload/image")
-async def upload_image(file: UploadFile = File(...), payload: dict = Depends(verify_token)):
-    if file.content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed: JPEG, PNG, WebP, GIF")
-    
-    # Generate unique filename
-    file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    unique_filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = IMAGES_DIR / unique_filename
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Return the URL path
-    file_url = f"/api/uploads/images/{unique_filename}"
-    return {"url": file_url, "filename": unique_filename}
-
-@api_router.post("/upload/video")
-async def upload_video(file: UploadFile = File(...), payload: dict = Depends(verify_token)):
-    if file.content_type not in ALLOWED_VIDEO_TYPES:
-        raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed: MP4, MOV, AVI, WebM")
-    
-    # Generate unique filename
-    file_ext = file.filename.split(".")[-1] if "." in file.filename else "mp4"
-    unique_filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = VIDEOS_DIR / unique_filename
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Return the URL path
-    file_url = f"/api/uploads/videos/{unique_filename}"
-    return {"url": file_url, "filename": unique_filename}
-
-# Include router and middleware
-app.include_router(api_router)
-
-# Mount uploads AFTER router to avoid conflicts
-app.mount("/api/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+MAX_IMAGE_UPLOAD_BYTES = int(os.environ.get('MAX_IMAGE_UPLOAD_BYTES', 20 * 1024 * 1024))
+MAX_VIDEO_UPLOAD_BYTES = int(os.environ.get('MAX_VIDEO_UPLOAD_BYTES', 500 * 1024 * 1024))
+
+def _write_chunk(buffer, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+async def save_upload(storage, chunks, kind: str, ext: str, max_bytes: int) -> dict:
+    """Write an upload to staging as it streams in, enforcing max_bytes, then store it under its content hash"""
+    ext = "".join(c for c in ext.lower() if c.isalnum())[:10]
+    tmp_path = storage.staging_dir / f"{uuid.uuid4().hex}.part"
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+        await run_in_threadpool(buffer.close)
+        key = content_key(kind, digest.hexdigest(), ext)
+        stored = await storage.put(key, tmp_path)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(tmp_path.unlink, True)
+        raise
+    upload_bytes.inc(size, kind=kind)
+    upload_duration.observe(time.perf_counter() - started, kind=kind)
+    return {
+        "key": key,
+        "url": f"/api/uploads/{key}",
+        "filename": key.rsplit("/", 1)[-1],
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "deduplicated": not stored
+    }
+
+async def receive_upload(request: Request, storage, kind: str, allowed_types: List[str], allowed_label: str, default_ext: str, max_bytes: int) -> dict:
+    """Parse the multipart body straight off the socket so oversized uploads are cut off before they hit disk"""
+    try:
+        check_content_length(request.headers, max_bytes)
+        file = await read_file_field(limit_body(request.stream(), max_bytes), request.headers.get("content-type", ""))
+        if file.content_type not in allowed_types:
+            raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed: {allowed_label}")
+        file_ext = file.filename.split(".")[-1] if "." in file.filename else default_ext
+        return await save_upload(storage, file.chunks(), kind, file_ext, max_bytes)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except MalformedUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# The endpoints read the body themselves, so describe the form for the docs
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+@api_router.post("/upload/image", openapi_extra=UPLOAD_OPENAPI)
+async def upload_image(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    payload: dict = Depends(verify_token),
+    resources: Resources = Depends(get_resources)
+):
+    # Save file under its content hash; identical uploads share one stored copy
+    saved = await receive_upload(
+        request, resources.storage, "images", ALLOWED_IMAGE_TYPES, "JPEG, PNG, WebP, GIF", "jpg", MAX_IMAGE_UPLOAD_BYTES
+    )
+    
+    # Generate resized variants in the background
+    if saved["filename"].rsplit(".", 1)[-1] not in SKIPPED_EXTENSIONS:
+        background_tasks.add_task(process_image_variants, resources, saved["key"], saved["url"])
+    
+    return saved
+
+@api_router.post("/upload/video", openapi_extra=UPLOAD_OPENAPI)
+async def upload_video(request: Request, payload: dict = Depends(verify_token), resources: Resources = Depends(get_resources)):
+    # Save file under its content hash; identical uploads share one stored copy
+    return await receive_upload(
+        request, resources.storage, "videos", ALLOWED_VIDEO_TYPES, "MP4, MOV, AVI, WebM", "mp4", MAX_VIDEO_UPLOAD_BYTES
+    )
 
 # Configure logging
 logging.basicConfig(
@@ -580,6 +1271,102 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+# ============ APP FACTORY ============
+
+async def prewarm(resources: Resources):
+    """Open pooled connections, import the payment stack and build the storefront before serving"""
+    importlib.import_module("emergentintegrations.payments.stripe.checkout")
+    resources.get_payment_client()
+    await asyncio.gather(*[resources.db.command("ping") for _ in range(resources.settings.prewarm_connections)])
+    await build_storefront_entry(resources)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    resources: Resources = app.state.resources
+    settings = resources.settings
+    started = time.perf_counter()
+    if settings.profiler_interval_ms > 0:
+        # Startup runs on the event loop thread, which is the one worth sampling
+        resources.profiler = StackSampler(settings.profiler_interval_ms / 1000)
+        resources.profiler.start()
+    
+    db = resources.db
+    await run_migrations(db)
+    await ensure_indexes(db)
+    await resources.admin_auth.ensure_admin_user()
+    await rebuild_search_index(resources)
+    resources.spawn(refresh_search_index_periodically(resources))
+    resources.spawn(release_expired_reservations_periodically(db))
+    resources.webhook_queue.start()
+    if settings.prewarm:
+        await prewarm(resources)
+    startup_duration.set(time.perf_counter() - started)
+    logger.info(f"Startup took {(time.perf_counter() - started) * 1000:.0f} ms (prewarm={settings.prewarm})")
+    
+    try:
+        yield
+    finally:
+        await resources.webhook_queue.stop()
+        if resources.profiler is not None:
+            resources.profiler.stop()
+        for task in list(resources.tasks):
+            task.cancel()
+        resources.client.close()
+        if resources.image_pool is not None:
+            resources.image_pool.shutdown(wait=False, cancel_futures=True)
+            resources.image_pool = None
+        if resources.payment_client is not None:
+            await resources.payment_client.close()
+            resources.payment_client = None
+
+def create_app(settings: Optional[Settings] = None, client=None) -> FastAPI:
+    """Build the API. Nothing connects until the lifespan starts, so this is cheap and needs no live services.
+    
+    Each app gets its own Resources (database, storage, caches, payment client) on ``app.state.resources``.
+    ``client`` replaces the Motor client built from ``settings.mongo_url``, e.g. with an in-memory one in tests.
+    """
+    settings = settings or Settings.from_env()
+    resources = Resources(settings, client)
+    resources.webhook_queue = WebhookQueue(
+        resources.db.webhook_events,
+        partial(apply_webhook_events, resources),
+        batch_size=settings.webhook_batch_size,
+        poll_interval=settings.webhook_poll_interval
+    )
+    
+    application = FastAPI(title="The Bklyn Garment Gallery API", lifespan=lifespan)
+    application.state.resources = resources
+    application.include_router(api_router)
+    
+    # Mount uploads AFTER router to avoid conflicts
+    application.mount("/api/uploads", MediaFiles(resources.storage), name="uploads")
+    
+    # Inside CORS so rejections still carry CORS headers and preflights are never throttled
+    application.add_middleware(
+        AdmissionMiddleware,
+        store=create_rate_limit_store(resources.db),
+        capacity=settings.admission_capacity,
+        reserve=settings.admission_reserve,
+        forwarded_hops=settings.forwarded_hops,
+    )
+    
+    application.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "X-Next-Cursor"],
+    )
+    
+    # Outermost, so latency includes CORS handling
+    application.add_middleware(MetricsMiddleware)
+    return application
+
+def __getattr__(name: str):
+    # `uvicorn server:app` gets an app built from the environment on first access rather than at import
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
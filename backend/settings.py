@@ -0,0 +1,49 @@
+"""Settings for ``server.create_app``.
+
+Only what the app factory needs to build resources lives here; tuning knobs
+read by individual features (cache TTLs, batch sizes, ...) stay next to the
+code that uses them. ``Settings.from_env()`` reads the same environment
+variables (and ``backend/.env``) the server always has.
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List
+
+ROOT_DIR = Path(__file__).parent
+
+
+@dataclass
+class Settings:
+    mongo_url: str
+    db_name: str
+    cors_origins: List[str] = field(default_factory=lambda: ["*"])
+    media_root: Path = ROOT_DIR / "uploads"
+    # Open pooled connections, import the payment SDK and build the storefront snapshot before serving
+    prewarm: bool = False
+    prewarm_connections: int = 10
+    webhook_batch_size: int = 100
+    webhook_poll_interval: float = 5.0
+    profiler_interval_ms: float = 0.0
+    # Admission control: in-flight requests per worker, the share kept for checkout and webhooks,
+    # and how many proxies in front of the app append to X-Forwarded-For
+    admission_capacity: int = 512
+    admission_reserve: float = 0.2
+    forwarded_hops: int = 1
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            mongo_url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            cors_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+            media_root=Path(os.environ.get('MEDIA_ROOT') or ROOT_DIR / "uploads"),
+            prewarm=os.environ.get('PREWARM', 'false').lower() in ('1', 'true', 'yes'),
+            prewarm_connections=int(os.environ.get('PREWARM_CONNECTIONS', '10')),
+            webhook_batch_size=int(os.environ.get('WEBHOOK_BATCH_SIZE', '100')),
+            webhook_poll_interval=float(os.environ.get('WEBHOOK_POLL_INTERVAL', '5')),
+            profiler_interval_ms=float(os.environ.get('PROFILER_INTERVAL_MS', '0')),
+            admission_capacity=int(os.environ.get('ADMISSION_CAPACITY', '512')),
+            admission_reserve=float(os.environ.get('ADMISSION_RESERVE', '0.2')),
+            forwarded_hops=int(os.environ.get('FORWARDED_HOPS', '1')),
+        )
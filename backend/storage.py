@@ -0,0 +1,251 @@
+"""Content-addressed media storage shared by every API worker.
+
+Uploads are stored under ``<kind>/<sha256>.<ext>`` keys, so the same file
+uploaded twice is kept once and an object never changes after it is written.
+Two backends implement the same small interface (``put``, ``exists``,
+``local_path``, ``delete`` and a ``staging_dir`` for in-progress uploads):
+
+* ``LocalStorage`` keeps objects under a directory. That is the default, and
+  also works for several nodes sharing a network filesystem.
+* ``S3Storage`` keeps them in an S3-compatible bucket (AWS, MinIO, R2, ...),
+  wrapped in ``CachedStorage``: a size-bounded local read-through cache that
+  downloads each object once per node, which is safe because objects are
+  immutable.
+
+Select with ``MEDIA_STORAGE=local|s3``; see ``create_storage`` for settings.
+For local development against MinIO, set ``S3_ENDPOINT_URL=http://localhost:9000``
+plus ``AWS_ACCESS_KEY_ID``/``AWS_SECRET_ACCESS_KEY``. Existing files under
+``uploads/`` can be copied into the configured backend, keeping their URLs,
+with ``python storage.py copy-local``.
+"""
+import asyncio
+import mimetypes
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from coalescing import SingleFlight, TTLCache
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def content_key(kind: str, sha256: str, ext: str) -> str:
+    return f"{kind}/{sha256}.{ext.lower()}" if ext else f"{kind}/{sha256}"
+
+
+class LocalStorage:
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        self.staging_dir = self.root / ".staging"
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Optional[Path]:
+        path = (self.root / key).resolve()
+        return path if self.root in path.parents else None
+
+    async def exists(self, key: str) -> bool:
+        path = self.path(key)
+        return path is not None and await run_in_threadpool(path.is_file)
+
+    async def put(self, key: str, src: Path) -> bool:
+        """Move a staged file into place; returns False (and drops it) if the key is already stored"""
+        dest = self.path(key)
+        if dest is None:
+            raise ValueError(f"Invalid storage key: {key}")
+        if await run_in_threadpool(dest.is_file):
+            await run_in_threadpool(Path(src).unlink, True)
+            return False
+        await run_in_threadpool(dest.parent.mkdir, 0o777, True, True)
+        await run_in_threadpool(os.replace, src, dest)
+        return True
+
+    async def local_path(self, key: str) -> Optional[Path]:
+        path = self.path(key)
+        if path is None or not await run_in_threadpool(path.is_file):
+            return None
+        return path
+
+    async def delete(self, key: str) -> None:
+        path = self.path(key)
+        if path is not None:
+            await run_in_threadpool(path.unlink, True)
+
+
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, region: Optional[str] = None):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(max_pool_connections=32, retries={"max_attempts": 3, "mode": "standard"}),
+        )
+
+    @staticmethod
+    def _missing(error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await run_in_threadpool(self.client.head_object, Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except ClientError as e:
+            if self._missing(e):
+                return False
+            raise
+
+    async def put(self, key: str, src: Path) -> bool:
+        if await self.exists(key):
+            return False
+        extra = {"ContentType": mimetypes.guess_type(key)[0] or "application/octet-stream", "CacheControl": CACHE_CONTROL}
+        # upload_file switches to parallel multipart uploads for large files
+        await run_in_threadpool(self.client.upload_file, str(src), self.bucket, self.prefix + key, ExtraArgs=extra)
+        return True
+
+    async def download(self, key: str, dest: Path) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await run_in_threadpool(self.client.download_file, self.bucket, self.prefix + key, str(dest))
+            return True
+        except ClientError as e:
+            if self._missing(e):
+                return False
+            raise
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.client.delete_object, Bucket=self.bucket, Key=self.prefix + key)
+
+
+class CachedStorage:
+    """Local read-through cache in front of a remote backend, evicting least recently used files"""
+
+    def __init__(self, remote, cache_dir: Path, max_bytes: int, miss_ttl: float = 60.0):
+        self.remote = remote
+        self.local = LocalStorage(cache_dir)
+        self.staging_dir = self.local.staging_dir
+        self.max_bytes = max_bytes
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._downloads = SingleFlight()
+        # Absent keys (e.g. probes for .br or .gz siblings) are remembered briefly
+        self._misses = TTLCache(max_entries=10000, ttl=miss_ttl)
+        for path in sorted(self.local.root.rglob("*"), key=lambda p: p.stat().st_atime if p.is_file() else 0):
+            if path.is_file() and self.staging_dir not in path.parents:
+                for evicted in self._track(path.relative_to(self.local.root).as_posix(), path.stat().st_size):
+                    evicted.unlink(missing_ok=True)
+
+    def _track(self, key: str, size: int) -> List[Path]:
+        """Account for a cached file; returns the least recently used files to delete to stay under max_bytes"""
+        self._total += size - self._sizes.pop(key, 0)
+        self._sizes[key] = size
+        evicted = []
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            evicted_key, evicted_size = self._sizes.popitem(last=False)
+            self._total -= evicted_size
+            path = self.local.path(evicted_key)
+            if path is not None:
+                evicted.append(path)
+        return evicted
+
+    async def _cache(self, key: str, size: int) -> None:
+        for path in self._track(key, size):
+            await run_in_threadpool(path.unlink, True)
+
+    async def exists(self, key: str) -> bool:
+        return key in self._sizes or await self.remote.exists(key)
+
+    async def put(self, key: str, src: Path) -> bool:
+        stored = await self.remote.put(key, src)
+        # Keep the staged copy as a warm cache entry for this node
+        size = (await run_in_threadpool(os.stat, src)).st_size
+        await self.local.put(key, src)
+        await self._cache(key, size)
+        self._misses.pop(key)
+        return stored
+
+    async def local_path(self, key: str) -> Optional[Path]:
+        if key in self._sizes:
+            path = await self.local.local_path(key)
+            if path is not None:
+                self._sizes.move_to_end(key)
+                return path
+        if self._misses.get(key) is not None:
+            return None
+        return await self._downloads.do(key, lambda: self._fetch(key))
+
+    async def _fetch(self, key: str) -> Optional[Path]:
+        if self.local.path(key) is None:
+            return None
+        tmp = self.staging_dir / f"{uuid.uuid4().hex}.part"
+        try:
+            if not await self.remote.download(key, tmp):
+                self._misses.put(key, True)
+                return None
+            size = (await run_in_threadpool(os.stat, tmp)).st_size
+            await self.local.put(key, tmp)
+        finally:
+            await run_in_threadpool(tmp.unlink, True)
+        await self._cache(key, size)
+        return self.local.path(key)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.gather(self.remote.delete(key), self.local.delete(key))
+        self._total -= self._sizes.pop(key, 0)
+
+
+def create_storage(media_root: Path):
+    """Build the media storage configured by the environment; ``media_root`` is the local directory"""
+    backend = os.environ.get("MEDIA_STORAGE", "local")
+    if backend == "local":
+        return LocalStorage(media_root)
+    if backend == "s3":
+        remote = S3Storage(
+            bucket=os.environ["S3_BUCKET"],
+            prefix=os.environ.get("S3_PREFIX", ""),
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            region=os.environ.get("S3_REGION") or None,
+        )
+        cache_dir = Path(os.environ.get("MEDIA_CACHE_DIR") or media_root.parent / "media-cache")
+        max_bytes = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+        return CachedStorage(remote, cache_dir, max_bytes)
+    raise ValueError(f"Unknown MEDIA_STORAGE backend: {backend}")
+
+
+async def copy_local_files(storage, root: Path) -> int:
+    """Copy existing files under ``root`` into ``storage`` with unchanged keys, so their URLs keep working"""
+    copied = 0
+    for path in sorted(root.rglob("*")):
+        relative = path.relative_to(root)
+        if not path.is_file() or any(part.startswith(".") for part in relative.parts):
+            continue
+        staged = storage.staging_dir / f"{uuid.uuid4().hex}.part"
+        await run_in_threadpool(shutil.copyfile, path, staged)
+        if await storage.put(relative.as_posix(), staged):
+            copied += 1
+    return copied
+
+
+if __name__ == "__main__":
+    import sys
+
+    from dotenv import load_dotenv
+
+    if sys.argv[1:2] != ["copy-local"]:
+        sys.exit("usage: python storage.py copy-local [SOURCE_DIR]")
+    root = Path(__file__).parent
+    load_dotenv(root / '.env')
+    source = Path(sys.argv[2]) if len(sys.argv) > 2 else root / "uploads"
+    copied = asyncio.run(copy_local_files(create_storage(Path(os.environ.get("MEDIA_ROOT") or root / "uploads")), source))
+    print(f"Copied {copied} files into {os.environ.get('MEDIA_STORAGE', 'local')} storage")
@@ -0,0 +1,145 @@
+"""Streaming multipart parsing for media uploads.
+
+The upload endpoints read ``request.stream()`` directly instead of letting
+Starlette spool the whole form to a temp file first, so the file part reaches
+staging in a single write and size limits are enforced while bytes arrive.
+"""
+from typing import AsyncIterator, Dict, List, Tuple
+
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+
+# Allowance for boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class MalformedUpload(ValueError):
+    pass
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File too large. Maximum size is {format_size(max_bytes)}")
+        self.max_bytes = max_bytes
+
+
+def format_size(num_bytes: float) -> str:
+    for unit in ("bytes", "KB", "MB"):
+        if num_bytes < 1024:
+            break
+        num_bytes /= 1024
+    else:
+        unit = "GB"
+    return f"{round(num_bytes, 1):g} {unit}"
+
+
+def check_content_length(headers, max_bytes: int) -> None:
+    """Reject up front when the declared body cannot fit a ``max_bytes`` file"""
+    try:
+        declared = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise MalformedUpload("Invalid Content-Length")
+    if declared > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadTooLarge(max_bytes)
+
+
+async def limit_body(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """Cut off bodies (chunked or lying about their length) once they outgrow ``max_bytes``"""
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes + MULTIPART_OVERHEAD:
+            raise UploadTooLarge(max_bytes)
+        yield chunk
+
+
+async def iter_multipart(chunks: AsyncIterator[bytes], content_type: str) -> AsyncIterator[Tuple[str, object]]:
+    """Yield ``("part", headers)``, ``("data", bytes)`` and ``("end", None)`` events as the body streams in"""
+    mimetype, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if mimetype != b"multipart/form-data" or not boundary:
+        raise MalformedUpload("Expected a multipart/form-data body")
+
+    events: List[Tuple[str, object]] = []
+    headers: Dict[str, str] = {}
+    field, value = [], []
+    finished = False
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        field.append(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        value.append(data[start:end])
+
+    def on_header_end():
+        headers[b"".join(field).decode("latin-1").lower()] = b"".join(value).decode("latin-1")
+        field.clear()
+        value.clear()
+
+    def on_headers_finished():
+        events.append(("part", dict(headers)))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    def on_end():
+        nonlocal finished
+        finished = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_end": on_end,
+    })
+    async for chunk in chunks:
+        try:
+            parser.write(chunk)
+        except MultipartParseError as error:
+            raise MalformedUpload(f"Malformed multipart body: {error}")
+        for event in events:
+            yield event
+        events.clear()
+    if not finished:
+        raise MalformedUpload("Incomplete multipart body")
+
+
+class FilePart:
+    """A file field whose body is still streaming; iterate ``chunks()`` exactly once"""
+
+    def __init__(self, headers: Dict[str, str], events: AsyncIterator[Tuple[str, object]]):
+        _, params = parse_options_header(headers.get("content-disposition", ""))
+        mimetype, _ = parse_options_header(headers.get("content-type", "application/octet-stream"))
+        self.filename: str = params.get(b"filename", b"").decode("utf-8", "replace")
+        self.content_type: str = mimetype.decode("latin-1")
+        self._events = events
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        async for kind, data in self._events:
+            if kind == "end":
+                return
+            if data:
+                yield data
+
+
+async def read_file_field(chunks: AsyncIterator[bytes], content_type: str, name: str = "file") -> FilePart:
+    """Skip ahead to the ``name`` file field and return it with its body unread"""
+    events = iter_multipart(chunks, content_type)
+    async for kind, data in events:
+        if kind != "part":
+            continue
+        _, params = parse_options_header(data.get("content-disposition", ""))
+        if params.get(b"name") == name.encode() and b"filename" in params:
+            return FilePart(data, events)
+    raise MalformedUpload(f"Missing file field '{name}'")
@@ -0,0 +1,132 @@
+"""Durable, deduplicated queue for incoming payment webhooks.
+
+The webhook route only verifies and enqueues; events are stored keyed by their
+provider event ID, so replays of the same event are dropped at insert time.
+A single background worker claims queued events in batches under a lease,
+hands each batch to the handler, and marks them done. Events whose lease
+expires (e.g. the worker died mid-batch) are picked up again, and failing
+events are retried until ``max_attempts`` before being parked as ``failed``.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookQueue:
+    def __init__(
+        self,
+        collection,
+        handler: Callable[[List[Dict]], Awaitable[None]],
+        batch_size: int = 100,
+        poll_interval: float = 5.0,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 10,
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def enqueue(self, event: Dict) -> bool:
+        """Store an event unless it was already received; returns True for new events"""
+        try:
+            result = await self.collection.update_one(
+                {"event_id": event["event_id"]},
+                {"$setOnInsert": {
+                    **event,
+                    "status": "queued",
+                    "attempts": 0,
+                    "received_at": datetime.now(timezone.utc),
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # A concurrent delivery of the same event won the upsert
+            return False
+        self._wakeup.set()
+        return result.upserted_id is not None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook worker error: {e}")
+                processed = 0
+            if processed < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Yield between full batches so a burst does not starve live requests
+                await asyncio.sleep(0)
+
+    async def process_batch(self) -> int:
+        now = datetime.now(timezone.utc)
+        claimable = {"$or": [
+            {"status": "queued"},
+            {"status": "processing", "lease_until": {"$lt": now}},
+        ]}
+        candidates = await self.collection.find(claimable, {"_id": 0, "event_id": 1}) \
+            .sort("received_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return 0
+
+        lease = str(uuid.uuid4())
+        await self.collection.update_many(
+            {"event_id": {"$in": [c["event_id"] for c in candidates]}, **claimable},
+            {
+                "$set": {"status": "processing", "lease": lease, "lease_until": now + timedelta(seconds=self.lease_seconds)},
+                "$inc": {"attempts": 1},
+            },
+        )
+        events = await self.collection.find({"lease": lease}, {"_id": 0}).to_list(len(candidates))
+        if not events:
+            return 0
+
+        try:
+            await self.handler(events)
+        except Exception as e:
+            logger.error(f"Failed to apply {len(events)} webhook events: {e}")
+            await self.collection.update_many(
+                {"lease": lease, "attempts": {"$gte": self.max_attempts}},
+                {"$set": {"status": "failed", "last_error": str(e)}, "$unset": {"lease": "", "lease_until": ""}},
+            )
+            await self.collection.update_many(
+                {"lease": lease},
+                {"$set": {"status": "queued", "last_error": str(e)}, "$unset": {"lease": "", "lease_until": ""}},
+            )
+            return 0
+
+        await self.collection.update_many(
+            {"lease": lease},
+            {"$set": {"status": "done", "processed_at": datetime.now(timezone.utc)}, "$unset": {"lease": "", "lease_until": ""}},
+        )
+        return len(events)
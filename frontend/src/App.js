@@ -144,29 +144,17 @@ const Home = () => {
   const [videos, setVideos] = useState([]);
 
   useEffect(() => {
-    fetchProducts();
-    fetchVideos();
+    fetchStorefront();
   }, []);
 
-  const fetchProducts = async () => {
+  const fetchStorefront = async () => {
     try {
-      const [featuredRes, newRes] = await Promise.all([
-        axios.get(`${API}/products?featured=true`),
-        axios.get(`${API}/products?new_arrival=true`)
-      ]);
-      setFeaturedProducts(featuredRes.data.slice(0, 4));
-      setNewArrivals(newRes.data.slice(0, 4));
-    } catch (e) {
-      console.error("Error fetching products:", e);
-    }
-  };
-
-  const fetchVideos = async () => {
-    try {
-      const res = await axios.get(`${API}/videos`);
-      setVideos(res.data.slice(0, 4));
+      const res = await axios.get(`${API}/storefront`);
+      setFeaturedProducts(res.data.featured.slice(0, 4));
+      setNewArrivals(res.data.new_arrivals.slice(0, 4));
+      setVideos(res.data.videos.slice(0, 4));
     } catch (e) {
-      console.error("Error fetching videos:", e);
+      console.error("Error fetching storefront:", e);
     }
   };
 
@@ -344,11 +332,38 @@ const VideoPlayer = ({ videoUrl, title }) => {
   );
 };
 
+// ============ RESPONSIVE IMAGES ============
+// Uploaded images get resized WebP/JPEG variants server side; they are keyed by the /api/uploads/ path
+const uploadPath = (url = "") => {
+  const index = url.indexOf("/api/uploads/");
+  return index === -1 ? url : url.slice(index);
+};
+
+const VariantImage = ({ src, variants, sizes, alt }) => {
+  const own = (variants || []).filter((v) => v.source === uploadPath(src));
+  if (!own.length) return <img src={src} alt={alt} loading="lazy" />;
+  const srcSet = (format) => own
+    .filter((v) => v.format === format)
+    .map((v) => `${BACKEND_URL}${v.url} ${v.width}w`)
+    .join(", ");
+  return (
+    <picture>
+      <source type="image/webp" srcSet={srcSet("webp")} sizes={sizes} />
+      <img src={src} srcSet={srcSet("jpeg")} sizes={sizes} alt={alt} loading="lazy" />
+    </picture>
+  );
+};
+
 // ============ PRODUCT CARD ============
 const ProductCard = ({ product }) => (
   <Link to={`/product/${product.id}`} className="product-card" data-testid={`product-card-${product.id}`}>
     <div className="product-image">
-      <img src={product.image_url} alt={product.name} />
+      <VariantImage
+        src={product.image_url}
+        variants={product.image_variants}
+        sizes="(max-width: 768px) 50vw, 25vw"
+        alt={product.name}
+      />
       {product.new_arrival && <span className="badge-new">NEW</span>}
     </div>
     <div className="product-info">
@@ -644,7 +659,12 @@ const Lookbook = () => {
         <div className="lookbook-grid">
           {items.map(item => (
             <div key={item.id} className="lookbook-item" data-testid={`lookbook-item-${item.id}`}>
-              <img src={item.image_url} alt={item.title} />
+              <VariantImage
+                src={item.image_url}
+                variants={item.image_variants}
+                sizes="(max-width: 768px) 100vw, 33vw"
+                alt={item.title}
+              />
               <div className="lookbook-overlay">
                 <h3>{item.title}</h3>
                 {item.description && <p>{item.description}</p>}
@@ -692,6 +712,12 @@ const About = () => (
 const Cart = () => {
   const { cart, removeFromCart, updateQuantity, cartTotal, clearCart } = useCart();
   const [loading, setLoading] = useState(false);
+  // One key per cart, so a double-clicked Pay button reuses the same Stripe session
+  const checkoutKey = useRef(null);
+
+  useEffect(() => {
+    checkoutKey.current = null;
+  }, [cart]);
 
   const handleCheckout = async () => {
     if (cart.length === 0) {
@@ -699,6 +725,9 @@ const Cart = () => {
       return;
     }
 
+    if (!checkoutKey.current) {
+      checkoutKey.current = window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
     setLoading(true);
     try {
       const res = await axios.post(`${API}/checkout`, {
@@ -712,7 +741,7 @@ const Cart = () => {
           image_url: item.image_url || ""
         })),
         origin_url: window.location.origin
-      });
+      }, { headers: { "Idempotency-Key": checkoutKey.current } });
 
       // Redirect to Stripe checkout
       window.location.href = res.data.checkout_url;
@@ -1700,6 +1729,11 @@ const Admin = () => {
   };
 
   const handleLogout = () => {
+    const token = localStorage.getItem("adminToken");
+    // Revoke server-side too; the local token is dropped either way
+    axios.post(`${API}/admin/logout`, null, {
+      headers: { Authorization: `Bearer ${token}` }
+    }).catch(() => {});
     localStorage.removeItem("adminToken");
     setIsAuthenticated(false);
   };
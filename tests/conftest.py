@@ -0,0 +1,83 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+# Cheap hashes for the seeded admin user; read when auth is imported
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+_mongod_reachable = None
+
+
+@pytest.fixture
+async def mongo_db():
+    """A throwaway database on the mongod at MONGO_URL; skips the test when none is reachable"""
+    global _mongod_reachable
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.errors import PyMongoError
+
+    client = AsyncIOMotorClient(
+        os.environ.get("MONGO_URL", "mongodb://localhost:27017"), tz_aware=True, serverSelectionTimeoutMS=1000
+    )
+    if _mongod_reachable is None:
+        try:
+            await client.admin.command("ping")
+            _mongod_reachable = True
+        except PyMongoError:
+            _mongod_reachable = False
+    if not _mongod_reachable:
+        client.close()
+        pytest.skip("no mongod reachable at MONGO_URL")
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    try:
+        yield client[name]
+    finally:
+        await client.drop_database(name)
+        client.close()
+
+
+@pytest.fixture
+def mock_db():
+    """An in-memory Motor stand-in for logic that does not depend on server-side behaviour"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient(tz_aware=True)[f"test_{uuid.uuid4().hex[:8]}"]
+
+
+@pytest.fixture
+def settings(tmp_path):
+    from settings import Settings
+
+    return Settings(mongo_url="mongodb://localhost:27017", db_name=f"test_{uuid.uuid4().hex[:8]}", media_root=tmp_path / "uploads")
+
+
+@pytest.fixture
+async def app(settings):
+    """The API on an in-memory database, with its lifespan running"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import server
+
+    application = server.create_app(settings, client=mongomock_motor.AsyncMongoMockClient(tz_aware=True))
+    async with application.router.lifespan_context(application):
+        yield application
+
+
+@pytest.fixture
+async def api(app):
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def admin_headers(app):
+    return {"Authorization": f"Bearer {app.state.resources.admin_auth.create_token('admin')}"}
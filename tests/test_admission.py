@@ -0,0 +1,180 @@
+"""Admission control: route classes, token buckets, load shedding and bulkheads."""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import admission
+from admission import AdmissionMiddleware, Bulkhead, MemoryRateLimitStore, MongoRateLimitStore, Policy, classify
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("method,path,authenticated,expected", [
+    ("GET", "/api/health", False, "exempt"),
+    ("POST", "/api/webhook/stripe", False, "webhook"),
+    ("POST", "/api/checkout", False, "checkout"),
+    ("GET", "/api/checkout/status/cs_1", False, "checkout_status"),
+    ("POST", "/api/admin/login", True, "login"),
+    ("GET", "/api/orders/o1", False, "order_lookup"),
+    ("GET", "/api/products", False, "browse"),
+    ("GET", "/api/products", True, "browse"),
+    ("POST", "/api/upload/image", True, "upload"),
+    ("POST", "/api/products/import", True, "admin"),
+    ("GET", "/api/products/export", True, "admin"),
+    ("PUT", "/api/products/p1", True, "admin"),
+    ("DELETE", "/api/lookbook/l1", True, "admin"),
+    ("GET", "/api/orders/export", True, "admin"),
+    ("POST", "/api/admin/logout", True, "admin"),
+    ("POST", "/api/products/import", False, "default"),
+    ("DELETE", "/api/products/p1", False, "default"),
+])
+def test_classify(method, path, authenticated, expected):
+    assert classify(method, path, authenticated) == expected
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+async def test_memory_bucket_spends_burst_then_refills(clock):
+    store = MemoryRateLimitStore()
+
+    assert [await store.take("k", 2.0, 3) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert await store.take("k", 2.0, 3) == pytest.approx(0.5)
+
+    clock[0] += 1.0
+    assert [await store.take("k", 2.0, 3) for _ in range(2)] == [0.0, 0.0]
+    assert await store.take("k", 2.0, 3) > 0
+    assert await store.take("other", 2.0, 3) == 0.0
+
+
+async def test_memory_store_forgets_least_recent_clients(clock):
+    store = MemoryRateLimitStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        await store.take(key, 1.0, 1)
+
+    # "a" was evicted, so it starts again from a full bucket
+    assert await store.take("a", 1.0, 1) == 0.0
+    assert await store.take("c", 1.0, 1) > 0
+
+
+async def test_mongo_bucket_spends_burst_then_refills(mongo_db):
+    store = MongoRateLimitStore(mongo_db.rate_limits)
+
+    assert [await store.take("k", 1000.0, 2) for _ in range(2)] == [0.0, 0.0]
+    await mongo_db.rate_limits.update_one({"_id": "k"}, {"$set": {"tokens": 0.0}})
+    assert await store.take("k", 0.001, 2) > 0
+
+    await asyncio.sleep(0.01)
+    assert await store.take("k", 1000.0, 2) == 0.0
+
+
+def gated_app(gate: asyncio.Event, entered: list):
+    async def app(scope, receive, send):
+        entered.append(scope["path"])
+        await gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+def client(middleware) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+
+
+async def wait_for_entries(entered: list, count: int) -> None:
+    while len(entered) < count:
+        await asyncio.sleep(0.001)
+
+
+async def test_rate_limit_answers_429_with_retry_after(clock):
+    gate = asyncio.Event()
+    gate.set()
+    middleware = AdmissionMiddleware(gated_app(gate, []), policies={
+        "browse": Policy(rate=0.5, burst=2), "default": Policy(),
+    })
+
+    async with client(middleware) as http:
+        statuses = [(await http.get("/api/products")).status_code for _ in range(2)]
+        limited = await http.get("/api/products")
+        other_client = await http.get("/api/products", headers={"X-Forwarded-For": "10.0.0.9"})
+
+    assert statuses == [200, 200]
+    assert limited.status_code == 429
+    assert limited.headers["retry-after"] == "2"
+    assert limited.json() == {"detail": "Too many requests"}
+    assert other_client.status_code == 200
+
+
+async def test_overload_sheds_browsing_but_admits_checkout():
+    gate, entered = asyncio.Event(), []
+    middleware = AdmissionMiddleware(gated_app(gate, entered), capacity=4, reserve=0.5, policies={
+        "browse": Policy(), "checkout": Policy(priority=True), "default": Policy(),
+    })
+
+    async with client(middleware) as http:
+        busy = [asyncio.create_task(http.get("/api/products")) for _ in range(2)]
+        await wait_for_entries(entered, 2)
+
+        shed = await http.get("/api/storefront")
+        checkout = asyncio.create_task(http.post("/api/checkout"))
+        await wait_for_entries(entered, 3)
+        gate.set()
+        responses = await asyncio.gather(*busy, checkout)
+
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "1"
+    assert [r.status_code for r in responses] == [200, 200, 200]
+
+
+async def test_full_bulkhead_queue_answers_503():
+    gate, entered = asyncio.Event(), []
+    middleware = AdmissionMiddleware(gated_app(gate, entered), policies={
+        "upload": Policy(concurrency=1, queue=1, queue_timeout=5.0), "default": Policy(),
+    })
+
+    async with client(middleware) as http:
+        running = asyncio.create_task(http.post("/api/upload/image"))
+        await wait_for_entries(entered, 1)
+        queued = asyncio.create_task(http.post("/api/upload/image"))
+        while middleware.bulkheads["upload"].waiting < 1:
+            await asyncio.sleep(0.001)
+
+        rejected = await http.post("/api/upload/image")
+        gate.set()
+        responses = await asyncio.gather(running, queued)
+
+    assert rejected.status_code == 503
+    assert [r.status_code for r in responses] == [200, 200]
+
+
+async def test_bulkhead_queue_timeout_gives_up_without_leaking_permits():
+    bulkhead = Bulkhead(limit=1, queue=4, timeout=0.01)
+    assert await bulkhead.acquire()
+
+    assert not await bulkhead.acquire()
+    assert bulkhead.waiting == 0
+
+    bulkhead.release()
+    assert await bulkhead.acquire()
+
+
+async def test_cancelled_waiter_does_not_keep_a_permit():
+    bulkhead = Bulkhead(limit=1, queue=4, timeout=5.0)
+    assert await bulkhead.acquire()
+    waiter = asyncio.create_task(bulkhead.acquire())
+    await asyncio.sleep(0)
+
+    # The permit is handed over and the waiter is cancelled before it resumes
+    bulkhead.release()
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert bulkhead.waiting == 0
+    assert await asyncio.wait_for(bulkhead.acquire(), 1.0)
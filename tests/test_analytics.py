@@ -0,0 +1,61 @@
+"""Sales rollups count each order once per key, incrementally and on rebuild."""
+from datetime import datetime, timezone
+
+import pytest
+
+from analytics import query_rollups, rebuild_rollups, record_sales
+
+pytestmark = pytest.mark.anyio
+
+PAID_AT = datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+ORDERS = [
+    {
+        "id": "o1", "payment_status": "paid", "paid_at": PAID_AT, "created_at": PAID_AT, "total": 250.0,
+        "items": [
+            {"product_id": "hoodie", "price": 100.0, "quantity": 1, "size": "M"},
+            {"product_id": "hoodie", "price": 100.0, "quantity": 1, "size": "L"},
+            {"product_id": "tee", "price": 50.0, "quantity": 1, "size": "M"},
+        ],
+    },
+    {
+        "id": "o2", "payment_status": "paid", "paid_at": PAID_AT, "created_at": PAID_AT, "total": 100.0,
+        "items": [{"product_id": "hoodie", "price": 100.0, "quantity": 1, "size": "M"}],
+    },
+]
+EXPECTED = {
+    "total": {"all": (350.0, 4, 2)},
+    "product": {"hoodie": (300.0, 3, 2), "tee": (50.0, 1, 1)},
+    "category": {"hoodies": (300.0, 3, 2), "tees": (50.0, 1, 1)},
+    "size": {"M": (250.0, 3, 2), "L": (100.0, 1, 1)},
+}
+
+
+async def seed_products(db) -> None:
+    await db.products.insert_many([{"id": "hoodie", "category": "hoodies"}, {"id": "tee", "category": "tees"}])
+
+
+async def rollup_totals(db) -> dict:
+    return {
+        dimension: {
+            t["key"]: (t["revenue"], t["units"], t["orders"])
+            for t in (await query_rollups(db, dimension, "2025-03-01", "2025-03-01"))["totals"]
+        }
+        for dimension in EXPECTED
+    }
+
+
+async def test_record_sales_counts_distinct_orders_per_key(mock_db):
+    await seed_products(mock_db)
+
+    await record_sales(mock_db, ORDERS)
+
+    assert await rollup_totals(mock_db) == EXPECTED
+
+
+async def test_rebuild_matches_incremental_rollups(mongo_db):
+    await seed_products(mongo_db)
+    await mongo_db.orders.insert_many([dict(order) for order in ORDERS])
+
+    await rebuild_rollups(mongo_db)
+
+    assert await rollup_totals(mongo_db) == EXPECTED
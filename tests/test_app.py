@@ -0,0 +1,67 @@
+"""Apps built by ``create_app`` own their resources and do not leak into each other."""
+import dataclasses
+
+import httpx
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+PRODUCT = {"name": "Logo Tee", "description": "Heavyweight", "price": 40.0, "category": "tees", "image_url": "/x.jpg"}
+
+
+def test_each_app_gets_its_own_resources(settings):
+    one = server.create_app(settings)
+    two = server.create_app(dataclasses.replace(settings, db_name="two"))
+
+    first, second = one.state.resources, two.state.resources
+    assert first.db.name == settings.db_name
+    assert second.db.name == "two"
+    for name in ("client", "storage", "catalog_cache", "search_index", "checkout_flight", "webhook_queue", "tasks"):
+        assert getattr(first, name) is not getattr(second, name), name
+
+
+async def test_apps_do_not_share_data_or_caches(settings, tmp_path):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def serve(db_name):
+        app = server.create_app(
+            dataclasses.replace(settings, db_name=db_name, media_root=tmp_path / db_name),
+            client=mongomock_motor.AsyncMongoMockClient(tz_aware=True)
+        )
+        headers = {"Authorization": f"Bearer {app.state.resources.admin_auth.create_token('admin')}"}
+        return app, headers
+
+    (one, one_headers), (two, _) = await serve("one"), await serve("two")
+    async with one.router.lifespan_context(one), two.router.lifespan_context(two):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=one), base_url="http://one") as first, \
+                httpx.AsyncClient(transport=httpx.ASGITransport(app=two), base_url="http://two") as second:
+            assert (await second.get("/api/products")).json() == []
+            created = await first.post("/api/products", json=PRODUCT, headers=one_headers)
+            assert created.status_code == 200
+
+            assert [p["id"] for p in (await first.get("/api/products")).json()] == [created.json()["id"]]
+            assert (await second.get("/api/products")).json() == []
+            assert (await second.get("/api/products/search", params={"q": "logo"})).json()["total"] == 0
+
+
+async def test_shutting_down_one_app_leaves_the_other_image_pool_running(settings, tmp_path):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    one, two = (
+        server.create_app(
+            dataclasses.replace(settings, db_name=name, media_root=tmp_path / name),
+            client=mongomock_motor.AsyncMongoMockClient(tz_aware=True)
+        )
+        for name in ("one", "two")
+    )
+
+    async with two.router.lifespan_context(two):
+        async with one.router.lifespan_context(one):
+            first = one.state.resources.get_image_pool()
+            second = two.state.resources.get_image_pool()
+            assert first is not second
+        assert one.state.resources.image_pool is None
+
+        # The other app's workers still take jobs
+        assert second.submit(sum, [1, 2]).result(timeout=30) == 3
@@ -0,0 +1,119 @@
+"""Admin login, token caching and revocation across workers."""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import auth
+from auth import AdminAuth, InvalidToken, TokenCache
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "test-secret-with-at-least-32-bytes!"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"time": time.time(), "monotonic": 1000.0}
+    monkeypatch.setattr(auth, "time", SimpleNamespace(time=lambda: now["time"], monotonic=lambda: now["monotonic"]))
+    return now
+
+
+@pytest.fixture
+def threadpool_calls(monkeypatch):
+    calls = []
+    run_in_threadpool = auth.run_in_threadpool
+
+    async def recording(fn, *args):
+        calls.append(fn.__name__)
+        return await run_in_threadpool(fn, *args)
+
+    monkeypatch.setattr(auth, "run_in_threadpool", recording)
+    return calls
+
+
+@pytest.fixture
+async def operator(app):
+    await app.state.resources.admin_auth.create_user("ops", "correct horse")
+    return "ops"
+
+
+async def test_login_returns_a_working_token(api, operator):
+    response = await api.post("/api/admin/login", json={"username": operator, "password": "correct horse"})
+
+    assert response.status_code == 200
+    token = response.json()["token"]
+    verified = await api.get("/api/admin/verify", headers={"Authorization": f"Bearer {token}"})
+    assert verified.json() == {"valid": True, "username": operator}
+
+
+@pytest.mark.parametrize("username,password", [("ops", "wrong"), ("nobody", "correct horse")])
+async def test_bad_credentials_are_rejected(api, operator, username, password):
+    response = await api.post("/api/admin/login", json={"username": username, "password": password})
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid credentials"}
+
+
+async def test_password_checks_run_in_the_threadpool(mock_db, threadpool_calls):
+    admin_auth = AdminAuth(mock_db, SECRET)
+    await admin_auth.create_user("ops", "correct horse")
+    threadpool_calls.clear()
+
+    assert (await admin_auth.authenticate("ops", "correct horse"))["username"] == "ops"
+    assert await admin_auth.authenticate("ops", "wrong") is None
+    assert threadpool_calls == ["checkpw", "checkpw"]
+
+
+async def test_unknown_users_are_checked_against_a_dummy_hash(mock_db, threadpool_calls):
+    admin_auth = AdminAuth(mock_db, SECRET)
+
+    assert await admin_auth.authenticate("nobody", "guess") is None
+    assert await admin_auth.authenticate("nobody", "guess") is None
+
+    # The dummy hash is made once, then every unknown user pays for a real check
+    assert threadpool_calls == ["hash_password", "checkpw", "checkpw"]
+
+
+async def test_token_rejected_after_logout(api, admin_headers):
+    assert (await api.post("/api/admin/logout", headers=admin_headers)).status_code == 200
+
+    response = await api.get("/api/admin/verify", headers=admin_headers)
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid token"}
+
+
+async def test_other_workers_drop_a_revoked_token_after_the_recheck_interval(mock_db, clock):
+    worker_a = AdminAuth(mock_db, SECRET, TokenCache(recheck=30))
+    worker_b = AdminAuth(mock_db, SECRET, TokenCache(recheck=30))
+    token = worker_a.create_token("ops")
+    payload = await worker_b.verify(token)
+
+    await worker_a.revoke(payload)
+    with pytest.raises(InvalidToken):
+        await worker_a.verify(token)
+
+    # Worker B trusts its cached entry until the recheck interval has passed
+    assert await worker_b.verify(token) == payload
+    clock["monotonic"] += 31
+    with pytest.raises(InvalidToken):
+        await worker_b.verify(token)
+
+
+def test_cached_tokens_expire_with_the_token(clock):
+    cache = TokenCache()
+    cache.put("t", {"jti": "j", "exp": clock["time"] + 60})
+
+    assert cache.get("t") == ({"jti": "j", "exp": clock["time"] + 60}, False)
+    clock["time"] += 61
+    assert cache.get("t") is None
+
+
+def test_token_cache_is_bounded(clock):
+    cache = TokenCache(max_entries=2)
+    for token in ("a", "b", "c"):
+        cache.put(token, {"jti": token, "exp": clock["time"] + 60})
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None and cache.get("c") is not None
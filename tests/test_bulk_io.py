@@ -0,0 +1,64 @@
+"""Bulk imports split lines across arbitrary chunks and report undecodable lines as row errors."""
+import json
+
+import pytest
+
+from bulk_io import iter_csv_rows, iter_lines, iter_ndjson_rows
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def collect(rows) -> list:
+    return [row async for row in rows]
+
+
+async def test_lines_span_chunks():
+    lines = await collect(iter_lines(chunks(b"ab", b"c\r", b"\nde", b"", b"f\n\ng", b"h")))
+
+    assert lines == ["abc", "def", "", "gh"]
+
+
+async def test_long_line_across_many_chunks():
+    line = b"x" * 100_000
+
+    lines = await collect(iter_lines(chunks(*[line[i:i + 7] for i in range(0, len(line), 7)], b"\nlast")))
+
+    assert lines == [line.decode(), "last"]
+
+
+async def test_invalid_utf8_ndjson_line_is_a_row_error():
+    rows = await collect(iter_ndjson_rows(iter_lines(chunks(b'{"a": 1}\n\xff\xfe\n{"b": 2}\n'))))
+
+    assert rows[0] == (1, {"a": 1})
+    assert rows[1][0] == 2 and isinstance(rows[1][1], UnicodeDecodeError)
+    assert rows[2] == (3, {"b": 2})
+
+
+async def test_invalid_utf8_csv_record_is_a_row_error():
+    body = b'name,price\nTee,10\n"Bad\n\xff",5\nCap,15\n'
+
+    rows = await collect(iter_csv_rows(iter_lines(chunks(body))))
+
+    assert rows[0] == (2, {"name": "Tee", "price": "10"})
+    assert rows[1][0] == 3 and isinstance(rows[1][1], UnicodeDecodeError)
+    assert rows[-1] == (5, {"name": "Cap", "price": "15"})
+
+
+async def test_import_reports_undecodable_lines(api, admin_headers):
+    product = {"name": "Tee", "description": "Plain", "price": 25.0, "category": "tees", "image_url": "/tee.jpg"}
+    body = b"\xff\xfe\n" + json.dumps(product).encode() + b"\n"
+
+    response = await api.post(
+        "/api/products/import", content=body,
+        headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 1
+    assert [error["line"] for error in report["errors"]] == [1]
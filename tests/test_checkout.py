@@ -0,0 +1,97 @@
+"""Checkout writes its order and payment transaction together and coalesces only identical carts."""
+import asyncio
+import dataclasses
+
+import pytest
+from pymongo.errors import PyMongoError
+
+import inventory
+import server
+from benchmarks.fakes import FakePaymentClient
+
+pytestmark = pytest.mark.anyio
+
+
+def cart(quantity: int = 1) -> dict:
+    return {
+        "items": [{"product_id": "p1", "name": "Logo Tee", "price": 1.0, "quantity": quantity, "size": "M"}],
+        "origin_url": "https://shop.example.com",
+    }
+
+
+@pytest.fixture
+async def payments(app):
+    resources = app.state.resources
+    await resources.db.products.insert_one({"id": "p1", "name": "Logo Tee", "price": 40.0, "category": "tees"})
+    await inventory.set_stock(resources.db, "p1", [{"size": "M", "available": 5}])
+    resources.payment_client = FakePaymentClient(latency=0.05)
+    return resources.payment_client
+
+
+async def test_failed_transaction_insert_rolls_back_order_and_stock(monkeypatch, app, payments):
+    resources = app.state.resources
+    collection_class = type(resources.db.payment_transactions)
+    insert_one = collection_class.insert_one
+
+    async def failing_insert(self, document, *args, **kwargs):
+        if self.name == "payment_transactions":
+            raise PyMongoError("write failed")
+        return await insert_one(self, document, *args, **kwargs)
+
+    monkeypatch.setattr(collection_class, "insert_one", failing_insert)
+
+    with pytest.raises(PyMongoError):
+        await server.start_checkout(resources, server.CheckoutRequest(**cart(2)), "http://test/", None)
+
+    assert await resources.db.orders.count_documents({}) == 0
+    stock = (await inventory.stock_levels(resources.db, "p1"))[0]
+    assert (stock["available"], stock["reserved"]) == (5, 0)
+
+
+async def test_concurrent_retries_of_one_cart_share_a_session(api, payments):
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first, second = await asyncio.gather(
+        api.post("/api/checkout", json=cart(), headers=headers),
+        api.post("/api/checkout", json=cart(), headers=headers),
+    )
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["session_id"] == second.json()["session_id"]
+    assert payments.calls == 1
+
+
+async def test_concurrent_reuse_of_a_key_with_another_cart_is_rejected(app, api, payments):
+    headers = {"Idempotency-Key": "reused"}
+
+    responses = await asyncio.gather(
+        api.post("/api/checkout", json=cart(1), headers=headers),
+        api.post("/api/checkout", json=cart(2), headers=headers),
+    )
+
+    assert sorted(r.status_code for r in responses) == [200, 422]
+    assert await app.state.resources.db.orders.count_documents({}) == 1
+    stock = (await inventory.stock_levels(app.state.resources.db, "p1"))[0]
+    assert stock["reserved"] in (1, 2) and stock["available"] + stock["reserved"] == 5
+
+
+async def test_status_fetched_before_a_webhook_is_not_cached_after_it(app, api, payments):
+    session_id = (await api.post("/api/checkout", json=cart())).json()["session_id"]
+    fetched, webhook_applied = asyncio.Event(), asyncio.Event()
+    get_checkout_status = payments.get_checkout_status
+
+    async def stale_status(session_id, base_url):
+        status = dataclasses.replace(await get_checkout_status(session_id, base_url))
+        fetched.set()
+        await webhook_applied.wait()
+        return status
+
+    payments.get_checkout_status = stale_status
+    polling = asyncio.create_task(api.get(f"/api/checkout/status/{session_id}"))
+    await fetched.wait()
+    payments.pay(session_id)
+    await server.mark_sessions_paid(app.state.resources, [session_id])
+    webhook_applied.set()
+
+    assert (await polling).json()["payment_status"] == "unpaid"
+    assert (await api.get(f"/api/checkout/status/{session_id}")).json()["payment_status"] == "paid"
@@ -0,0 +1,25 @@
+"""TTL cache invalidation generations."""
+from coalescing import TTLCache
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = TTLCache()
+    generation = cache.generation("cs_1")
+
+    cache.pop("cs_1")
+    cache.put("cs_1", "unpaid", generation=generation)
+    assert cache.get("cs_1") is None
+
+    cache.put("cs_1", "paid", generation=cache.generation("cs_1"))
+    assert cache.get("cs_1") == "paid"
+
+
+def test_forgotten_invalidations_still_drop_older_writes():
+    cache = TTLCache(max_entries=2)
+    generation = cache.generation("a")
+
+    for key in ("a", "b", "c"):
+        cache.pop(key)
+    cache.put("a", "stale", generation=generation)
+
+    assert cache.get("a") is None
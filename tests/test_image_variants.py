@@ -0,0 +1,73 @@
+"""Uploaded images get variants however the admin UI writes their URL."""
+import io
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+BACKEND = "https://backend.example.com"
+
+
+def png(width: int = 800, height: int = 600) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def product(image_url: str) -> dict:
+    return {"name": "Logo Tee", "description": "Heavyweight", "price": 40.0, "category": "tees", "image_url": image_url}
+
+
+@pytest.fixture
+async def uploaded(api, admin_headers):
+    pytest.importorskip("PIL")
+    response = await api.post(
+        "/api/upload/image", files={"file": ("tee.png", png(), "image/png")}, headers=admin_headers
+    )
+    assert response.status_code == 200
+    return response.json()["url"]
+
+
+@pytest.mark.parametrize("url,expected", [
+    ("/api/uploads/images/a.jpg", "/api/uploads/images/a.jpg"),
+    (f"{BACKEND}/api/uploads/images/a.jpg", "/api/uploads/images/a.jpg"),
+    ("https://images.unsplash.com/photo-1?fm=jpg", "https://images.unsplash.com/photo-1?fm=jpg"),
+])
+def test_upload_path(url, expected):
+    assert server.upload_path(url) == expected
+
+
+async def test_product_created_with_absolute_url_gets_variants(api, admin_headers, uploaded):
+    response = await api.post("/api/products", json=product(f"{BACKEND}{uploaded}"), headers=admin_headers)
+
+    variants = response.json()["image_variants"]
+    assert {(v["format"], v["width"]) for v in variants} == {
+        ("webp", 320), ("jpeg", 320), ("webp", 640), ("jpeg", 640), ("webp", 800), ("jpeg", 800)
+    }
+    assert all(v["source"] == uploaded for v in variants)
+
+
+async def test_variants_are_tagged_onto_documents_using_absolute_urls(app, api, admin_headers, uploaded):
+    resources = app.state.resources
+    await resources.db.image_variants.delete_many({})
+    created = (await api.post("/api/products", json=product(f"{BACKEND}{uploaded}"), headers=admin_headers)).json()
+    assert created["image_variants"] == []
+
+    await server.process_image_variants(resources, uploaded.removeprefix("/api/uploads/"), uploaded)
+
+    stored = await resources.db.products.find_one({"id": created["id"]})
+    assert len(stored["image_variants"]) == 6
+
+
+async def test_variant_redirect_accepts_absolute_urls(api, uploaded):
+    response = await api.get(
+        "/api/images/variant", params={"url": f"{BACKEND}{uploaded}", "width": 300, "format": "webp"}
+    )
+
+    assert response.status_code == 307
+    assert response.headers["location"].startswith("/api/uploads/images/variants/")
+    assert response.headers["location"].endswith("_thumb.webp")
@@ -0,0 +1,49 @@
+"""The hot queries must be served from the indexes ``ensure_indexes`` declares."""
+import pytest
+
+from indexes import REQUIRED_INDEXES, ensure_indexes
+
+pytestmark = pytest.mark.anyio
+
+NEWEST_FIRST = [("created_at", -1), ("id", -1)]
+
+HOT_QUERIES = [
+    ("products", {"id": "p1"}, None),
+    ("products", {}, NEWEST_FIRST),
+    ("products", {"category": "hoodies"}, NEWEST_FIRST),
+    ("products", {"featured": True}, NEWEST_FIRST),
+    ("products", {"new_arrival": True}, NEWEST_FIRST),
+    ("orders", {"id": "o1"}, None),
+    ("orders", {"session_id": "cs_1"}, None),
+    ("orders", {}, NEWEST_FIRST),
+    ("payment_transactions", {"session_id": "cs_1"}, None),
+]
+
+
+def plan_stages(plan) -> list:
+    if isinstance(plan, dict):
+        stages = [plan["stage"]] if "stage" in plan else []
+        return stages + [s for value in plan.values() for s in plan_stages(value)]
+    if isinstance(plan, list):
+        return [s for value in plan for s in plan_stages(value)]
+    return []
+
+
+async def test_ensure_indexes_reports_nothing_missing(mongo_db):
+    report = await ensure_indexes(mongo_db)
+    assert set(report) == set(REQUIRED_INDEXES)
+    assert all(not status["missing"] for status in report.values()), report
+
+
+@pytest.mark.parametrize("collection,query,sort", HOT_QUERIES)
+async def test_hot_query_uses_index(mongo_db, collection, query, sort):
+    await ensure_indexes(mongo_db)
+    cursor = mongo_db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    stages = plan_stages((await cursor.explain())["queryPlanner"]["winningPlan"])
+
+    assert any("IXSCAN" in stage for stage in stages), stages
+    assert "COLLSCAN" not in stages
+    # The keyset indexes exist so the sort never happens in memory
+    assert "SORT" not in stages
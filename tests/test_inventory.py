@@ -0,0 +1,148 @@
+"""Checkout stock reservations: all-or-nothing holds, release, conversion and no oversell."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import inventory
+
+pytestmark = pytest.mark.anyio
+
+TTL = 1800
+
+
+def line(product_id: str, size: str = "M", quantity: int = 1, color: str = "") -> dict:
+    return {"product_id": product_id, "size": size, "color": color, "quantity": quantity}
+
+
+async def level(db, product_id: str, size: str = "M") -> dict:
+    return next(l for l in await inventory.stock_levels(db, product_id) if l["size"] == size)
+
+
+async def reservation_status(db, order_id: str) -> str:
+    return (await db.reservations.find_one({"order_id": order_id}))["status"]
+
+
+async def expire_all(db) -> None:
+    await db.reservations.update_many({}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+
+
+async def test_reserve_moves_available_to_reserved(mock_db):
+    await inventory.set_stock(mock_db, "p1", [{"size": "M", "available": 5}])
+
+    reservation = await inventory.reserve(mock_db, "o1", [line("p1", quantity=2), line("p1", quantity=1)], TTL)
+
+    assert reservation["lines"] == [{"product_id": "p1", "sku": "M|", "quantity": 3}]
+    assert await level(mock_db, "p1") == {"size": "M", "color": "", "sku": "M|", "available": 2, "reserved": 3, "sold": 0}
+
+
+async def test_untracked_products_are_not_reserved(mock_db):
+    assert await inventory.reserve(mock_db, "o1", [line("untracked")], TTL) is None
+    assert await mock_db.reservations.count_documents({}) == 0
+
+
+async def test_unknown_size_of_tracked_product_is_out_of_stock(mock_db):
+    await inventory.set_stock(mock_db, "p1", [{"size": "M", "available": 5}])
+
+    with pytest.raises(inventory.OutOfStock):
+        await inventory.reserve(mock_db, "o1", [line("p1", size="XL")], TTL)
+
+
+async def test_partial_cart_failure_gives_back_what_it_took(mock_db):
+    await inventory.set_stock(mock_db, "p1", [{"size": "M", "available": 5}, {"size": "L", "available": 1}])
+
+    with pytest.raises(inventory.OutOfStock) as raised:
+        await inventory.reserve(mock_db, "o1", [line("p1", "M", 2), line("p1", "L", 2)], TTL)
+
+    assert raised.value.size == "L"
+    assert await level(mock_db, "p1", "M") == {"size": "M", "color": "", "sku": "M|", "available": 5, "reserved": 0, "sold": 0}
+    assert (await level(mock_db, "p1", "L"))["available"] == 1
+    assert await mock_db.reservations.count_documents({}) == 0
+
+
+async def test_release_returns_stock_once(mock_db):
+    await inventory.set_stock(mock_db, "p1", [{"size": "M", "available": 5}])
+    await inventory.reserve(mock_db, "o1", [line("p1", quantity=2)], TTL)
+
+    assert await inventory.release_orders(mock_db, ["o1"]) == 1
+    assert await inventory.release_orders(mock_db, ["o1"]) == 0
+
+    stock = await level(mock_db, "p1")
+    assert (stock["available"], stock["reserved"]) == (5, 0)
+    assert await reservation_status(mock_db, "o1") == "released"
+
+
+async def test_release_expired_only_touches_lapsed_holds(mock_db):
+    await inventory.set_stock(mock_db, "p1", [{"size": "M", "available": 5}])
+    await inventory.reserve(mock_db, "lapsed", [line("p1")], TTL)
+    await expire_all(mock_db)
+    await inventory.reserve(mock_db, "live", [line("p1")], TTL)
+
+    assert await inventory.release_expired(mock_db) == 1
+    assert await reservation_status(mock_db, "lapsed") == "released"
+    assert await reservation_status(mock_db, "live") == "held"
+
+
+async def test_convert_turns_held_stock_into_sales(mock_db):
+    await inventory.set_stock(mock_db, "p1", [{"size": "M", "available": 5}])
+    await inventory.reserve(mock_db, "o1", [line("p1", quantity=2)], TTL)
+
+    assert await inventory.convert(mock_db, ["o1"]) == []
+    assert await inventory.convert(mock_db, ["o1"]) == []
+
+    stock = await level(mock_db, "p1")
+    assert (stock["available"], stock["reserved"], stock["sold"]) == (3, 0, 2)
+    assert await reservation_status(mock_db, "o1") == "converted"
+
+
+async def test_late_payment_after_release_takes_from_stock(mock_db):
+    await inventory.set_stock(mock_db, "p1", [{"size": "M", "available": 5}])
+    await inventory.reserve(mock_db, "o1", [line("p1", quantity=2)], TTL)
+    await inventory.release_orders(mock_db, ["o1"])
+
+    assert await inventory.convert(mock_db, ["o1"]) == []
+
+    stock = await level(mock_db, "p1")
+    assert (stock["available"], stock["reserved"], stock["sold"]) == (3, 0, 2)
+    assert await reservation_status(mock_db, "o1") == "converted"
+
+
+async def test_late_payment_without_stock_is_flagged_as_shortfall(mock_db):
+    await inventory.set_stock(mock_db, "p1", [{"size": "M", "available": 1}])
+    await inventory.reserve(mock_db, "o1", [line("p1")], TTL)
+    await inventory.release_orders(mock_db, ["o1"])
+    await inventory.reserve(mock_db, "o2", [line("p1")], TTL)
+    await inventory.convert(mock_db, ["o2"])
+
+    assert await inventory.convert(mock_db, ["o1"]) == ["o1"]
+
+    stock = await level(mock_db, "p1")
+    assert (stock["available"], stock["reserved"], stock["sold"]) == (0, 0, 1)
+    assert await reservation_status(mock_db, "o1") == "shortfall"
+
+
+async def test_limited_drop_never_oversells(mongo_db):
+    """Concurrent buyers race for the last units inside MongoDB; exactly ``stock`` of them win"""
+    stock, buyers = 50, 500
+    await inventory.set_stock(mongo_db, "drop", [{"size": "M", "available": stock}])
+
+    async def buy(i: int):
+        try:
+            return await inventory.reserve(mongo_db, f"o{i}", [line("drop")], TTL)
+        except inventory.OutOfStock:
+            return None
+
+    won = [r["order_id"] for r in await asyncio.gather(*[buy(i) for i in range(buyers)]) if r]
+
+    assert len(won) == stock
+    counters = await level(mongo_db, "drop")
+    assert (counters["available"], counters["reserved"], counters["sold"]) == (0, stock, 0)
+
+    # Half pay, the rest lapse: paid holds become sales, lapsed ones go back to stock
+    paid = won[::2]
+    assert await inventory.convert(mongo_db, paid) == []
+    await expire_all(mongo_db)
+    await inventory.release_expired(mongo_db)
+
+    counters = await level(mongo_db, "drop")
+    assert (counters["available"], counters["reserved"], counters["sold"]) == (stock - len(paid), 0, len(paid))
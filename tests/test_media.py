@@ -0,0 +1,77 @@
+"""Media serving: precompressed siblings follow Accept-Encoding q-values, zero-copy sends from a thread."""
+import gzip
+import os
+
+import httpx
+import pytest
+
+import media
+from media import MediaFiles, parse_qualities
+from storage import LocalStorage
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images/a.css").write_bytes(b"plain body")
+    (tmp_path / "images/a.css.br").write_bytes(b"brotli")
+    (tmp_path / "images/a.css.gz").write_bytes(gzip.compress(b"plain body"))
+    return MediaFiles(LocalStorage(tmp_path))
+
+
+async def get(app, path: str, **headers) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        return await http.get(path, headers=headers)
+
+
+def test_parse_qualities():
+    assert parse_qualities("gzip, br;q=0, *;q=0.5, X-Custom ; Q=0.2, bad;q=oops") == {
+        "gzip": 1.0, "br": 0.0, "*": 0.5, "x-custom": 0.2, "bad": 0.0,
+    }
+
+
+@pytest.mark.parametrize("accept_encoding,body,encoding", [
+    ("br, gzip", b"brotli", "br"),
+    ("br;q=0, gzip", b"plain body", "gzip"),
+    ("br;q=0, gzip;q=0", b"plain body", None),
+    ("abr-foo, xgzip", b"plain body", None),
+    ("*", b"brotli", "br"),
+    ("*;q=0.1, br;q=0", b"plain body", "gzip"),
+    ("identity", b"plain body", None),
+])
+async def test_precompressed_sibling_follows_accept_encoding(files, accept_encoding, body, encoding):
+    response = await get(files, "/images/a.css", **{"Accept-Encoding": accept_encoding})
+
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == body
+
+
+async def test_zero_copy_send_opens_the_file_off_the_event_loop(monkeypatch, files):
+    threaded, sent = [], []
+    run_sync = media.anyio.to_thread.run_sync
+
+    async def recording(fn, *args, **kwargs):
+        threaded.append(getattr(fn, "__name__", fn))
+        return await run_sync(fn, *args, **kwargs)
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopysend":
+            message = {**message, "data": os.pread(message["file"], message["count"], message["offset"])}
+        sent.append(message)
+
+    monkeypatch.setattr(media.anyio.to_thread, "run_sync", recording)
+    scope = {
+        "type": "http", "method": "GET", "path": "/images/a.css", "root_path": "",
+        "headers": [(b"range", b"bytes=6-9")], "extensions": {"http.response.zerocopysend": {}},
+    }
+
+    await files(scope, None, send)
+
+    assert sent[0]["status"] == 206
+    assert sent[1]["type"] == "http.response.zerocopysend"
+    assert sent[1]["data"] == b"body"
+    assert "open" in threaded and threaded[-1] == "close"
@@ -0,0 +1,56 @@
+"""Order endpoints never expose checkout and payment bookkeeping."""
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+INTERNAL = set(server.ORDER_INTERNAL_FIELDS)
+
+
+@pytest.fixture
+async def order(app):
+    doc = {
+        "id": "o1",
+        "items": [{"product_id": "p1", "name": "Tee", "price": 40.0, "quantity": 1, "size": "M"}],
+        "total": 40.0,
+        "status": "paid",
+        "payment_status": "paid",
+        "session_id": "cs_1",
+        "customer_email": "",
+        "shipping_address": {},
+        "created_at": datetime.now(timezone.utc),
+        "paid_at": datetime.now(timezone.utc),
+        "checkout_url": "https://checkout.stripe.test/cs_1",
+        "idempotency_key": "key-1",
+        "checkout_fingerprint": "abc",
+        "paid_batch": "batch-1",
+        "inventory_shortfall": True,
+    }
+    await app.state.resources.db.orders.insert_one(dict(doc))
+    return doc
+
+
+async def test_public_order_lookup_returns_only_order_fields(api, order):
+    response = await api.get("/api/orders/o1")
+
+    assert response.status_code == 200
+    assert set(response.json()) == set(server.Order.model_fields)
+
+
+async def test_admin_order_list_hides_internal_fields(api, admin_headers, order):
+    [listed] = (await api.get("/api/orders", headers=admin_headers)).json()
+
+    assert not INTERNAL & set(listed)
+    assert listed["inventory_shortfall"] is True
+
+
+async def test_admin_order_export_hides_internal_fields(api, admin_headers, order):
+    response = await api.get("/api/orders/export", headers=admin_headers)
+    [exported] = [json.loads(line) for line in response.text.splitlines()]
+
+    assert not INTERNAL & set(exported)
+    assert exported["inventory_shortfall"] is True
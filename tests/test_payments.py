@@ -0,0 +1,56 @@
+"""The Stripe client owns its HTTP pool and never pins a webhook URL from a request."""
+import pytest
+
+from payments import StripePaymentClient
+
+pytestmark = pytest.mark.anyio
+
+stripe = pytest.importorskip("stripe")
+
+
+@pytest.fixture
+def sdk_settings():
+    saved = (stripe.default_http_client, stripe.api_base, stripe.max_network_retries)
+    yield saved
+    stripe.default_http_client, stripe.api_base, stripe.max_network_retries = saved
+
+
+async def test_close_closes_the_pool_and_restores_the_sdk(monkeypatch, sdk_settings):
+    client = StripePaymentClient("sk_test", api_base="http://localhost:12111", max_retries=5)
+    closed = []
+    monkeypatch.setattr(client.http_client, "close", lambda: closed.append(True))
+
+    assert stripe.default_http_client is client.http_client
+    assert (stripe.api_base, stripe.max_network_retries) == ("http://localhost:12111", 5)
+
+    await client.close()
+
+    assert closed == [True]
+    assert (stripe.default_http_client, stripe.api_base, stripe.max_network_retries) == sdk_settings
+
+
+async def test_clients_closed_out_of_order_leave_the_open_one_installed(sdk_settings):
+    first = StripePaymentClient("sk_test_1", api_base="http://first")
+    second = StripePaymentClient("sk_test_2")
+
+    await second.close()
+    assert (stripe.default_http_client, stripe.api_base) == (first.http_client, "http://first")
+
+    third = StripePaymentClient("sk_test_3")
+    await first.close()
+    assert (stripe.default_http_client, stripe.api_base) == (third.http_client, sdk_settings[1])
+
+    await third.close()
+    await third.close()
+    assert (stripe.default_http_client, stripe.api_base, stripe.max_network_retries) == sdk_settings
+
+
+async def test_webhook_url_is_not_pinned_from_the_first_request(sdk_settings):
+    pytest.importorskip("emergentintegrations")
+    client = StripePaymentClient("sk_test")
+    try:
+        assert client._get_checkout("http://evil.example/").webhook_url == "http://evil.example/api/webhook/stripe"
+        assert client._get_checkout("https://shop.example/").webhook_url == "https://shop.example/api/webhook/stripe"
+        assert client.webhook_url is None
+    finally:
+        await client.close()
@@ -0,0 +1,154 @@
+"""S3 storage and its local read-through cache, against a stubbed S3 client."""
+import io
+
+import pytest
+
+from storage import CACHE_CONTROL, CachedStorage, S3Storage
+
+pytestmark = pytest.mark.anyio
+
+boto3 = pytest.importorskip("boto3")
+from botocore.response import StreamingBody  # noqa: E402
+from botocore.stub import ANY, Stubber  # noqa: E402
+
+
+class FakeS3:
+    """Queues S3 responses in call order; s3transfer's own request parameters are not pinned"""
+
+    def __init__(self, storage: S3Storage):
+        self.storage = storage
+        self.stubber = Stubber(storage.client)
+
+    def object_params(self, key: str) -> dict:
+        return {"Bucket": self.storage.bucket, "Key": self.storage.prefix + key}
+
+    def missing(self, key: str, transfer: bool = False) -> None:
+        self.stubber.add_client_error(
+            "head_object", service_error_code="404", http_status_code=404,
+            expected_params=None if transfer else self.object_params(key),
+        )
+
+    def present(self, key: str) -> None:
+        self.stubber.add_response("head_object", {"ContentLength": 1}, self.object_params(key))
+
+    def stored(self, key: str) -> None:
+        self.missing(key)
+        self.stubber.add_response("put_object", {}, None)
+
+    def download(self, data: bytes) -> None:
+        self.stubber.add_response("head_object", {"ContentLength": len(data), "ETag": '"etag"'}, None)
+        self.stubber.add_response(
+            "get_object",
+            {"Body": StreamingBody(io.BytesIO(data), len(data)), "ContentLength": len(data), "ETag": '"etag"'},
+            None,
+        )
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    fake = FakeS3(S3Storage("media", prefix="/shop/", region="us-east-1"))
+    with fake.stubber:
+        yield fake
+        fake.stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def cached(s3, tmp_path):
+    return CachedStorage(s3.storage, tmp_path / "cache", max_bytes=10)
+
+
+def staged(storage, data: bytes):
+    path = storage.staging_dir / f"{data.hex()}.part"
+    path.write_bytes(data)
+    return path
+
+
+async def test_put_uploads_new_objects_with_immutable_headers(s3, tmp_path):
+    src = tmp_path / "a.jpg"
+    src.write_bytes(b"jpeg")
+    s3.missing("images/a.jpg")
+    s3.stubber.add_response("put_object", {}, {
+        "Bucket": "media", "Key": "shop/images/a.jpg", "Body": ANY,
+        "ContentType": "image/jpeg", "CacheControl": CACHE_CONTROL, "ChecksumAlgorithm": ANY,
+    })
+    s3.present("images/a.jpg")
+
+    assert await s3.storage.put("images/a.jpg", src)
+    assert not await s3.storage.put("images/a.jpg", src)
+
+
+async def test_download_reports_missing_objects(s3, tmp_path):
+    s3.missing("images/gone.jpg", transfer=True)
+
+    assert not await s3.storage.download("images/gone.jpg", tmp_path / "gone.jpg")
+
+
+async def test_cached_put_keeps_a_warm_local_copy(s3, cached):
+    s3.stored("images/a.jpg")
+
+    assert await cached.put("images/a.jpg", staged(cached, b"abcd"))
+
+    # Served from the cache without another S3 call
+    assert (await cached.local_path("images/a.jpg")).read_bytes() == b"abcd"
+    assert await cached.exists("images/a.jpg")
+
+
+async def test_cached_get_downloads_once(s3, cached):
+    s3.download(b"webp")
+
+    first = await cached.local_path("images/a.webp")
+    second = await cached.local_path("images/a.webp")
+
+    assert first == second
+    assert first.read_bytes() == b"webp"
+    assert list(cached.staging_dir.iterdir()) == []
+
+
+async def test_missing_keys_are_remembered(s3, cached):
+    s3.missing("images/a.jpg.br", transfer=True)
+
+    assert await cached.local_path("images/a.jpg.br") is None
+    # A second probe inside the miss TTL does not reach S3
+    assert await cached.local_path("images/a.jpg.br") is None
+
+
+async def test_put_clears_a_remembered_miss(s3, cached):
+    s3.missing("images/a.webp", transfer=True)
+    s3.stored("images/a.webp")
+
+    assert await cached.local_path("images/a.webp") is None
+    await cached.put("images/a.webp", staged(cached, b"webp"))
+
+    assert (await cached.local_path("images/a.webp")).read_bytes() == b"webp"
+
+
+async def test_least_recently_used_files_are_evicted(s3, cached):
+    for key, data in (("images/a", b"aaaa"), ("images/b", b"bbbb")):
+        s3.stored(key)
+        await cached.put(key, staged(cached, data))
+    # Reading "a" makes "b" the least recently used
+    await cached.local_path("images/a")
+    s3.stored("images/c")
+    await cached.put("images/c", staged(cached, b"cccc"))
+
+    assert not (cached.local.root / "images/b").exists()
+    assert (cached.local.root / "images/a").exists() and (cached.local.root / "images/c").exists()
+
+    # An evicted file is fetched again on demand
+    s3.download(b"bbbb")
+    assert (await cached.local_path("images/b")).read_bytes() == b"bbbb"
+    assert not (cached.local.root / "images/a").exists()
+
+
+def test_cache_trims_existing_files_on_startup(tmp_path):
+    root = tmp_path / "cache"
+    (root / "images").mkdir(parents=True)
+    for name in ("a", "b", "c"):
+        (root / "images" / name).write_bytes(b"xxxx")
+
+    cached = CachedStorage(remote=None, cache_dir=root, max_bytes=10)
+
+    assert sum(1 for p in (root / "images").iterdir()) == 2
+    assert cached._total == 8
@@ -0,0 +1,113 @@
+"""Upload size limits are enforced while the body streams, before anything is stored."""
+import pytest
+
+import server
+import uploads
+
+pytestmark = pytest.mark.anyio
+
+BOUNDARY = "test-boundary"
+MULTIPART = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def form(data: bytes, filename: str = "clip.mp4", content_type: str = "video/mp4") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\nhello\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def chunked(body: bytes, size: int = 4096):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def staged(app) -> list:
+    return list(app.state.resources.storage.staging_dir.iterdir())
+
+
+@pytest.mark.parametrize("num_bytes,expected", [
+    (500, "500 bytes"), (512 * 1024, "512 KB"), (1536 * 1024, "1.5 MB"), (20 * 1024 * 1024, "20 MB"),
+])
+def test_format_size(num_bytes, expected):
+    assert uploads.format_size(num_bytes) == expected
+
+
+async def test_multipart_parts_stream_in_small_chunks():
+    data = bytes(range(256)) * 40
+
+    file = await uploads.read_file_field(chunked(form(data), size=7), MULTIPART)
+
+    assert (file.filename, file.content_type) == ("clip.mp4", "video/mp4")
+    assert b"".join([chunk async for chunk in file.chunks()]) == data
+
+
+async def test_streamed_upload_is_stored_and_deduplicated(api, admin_headers):
+    body = form(b"x" * 10_000)
+    headers = {**admin_headers, "Content-Type": MULTIPART}
+
+    first = (await api.post("/api/upload/video", content=chunked(body), headers=headers)).json()
+    second = (await api.post("/api/upload/video", content=chunked(body), headers=headers)).json()
+
+    assert first["size"] == 10_000
+    assert first["key"].startswith("videos/") and first["key"].endswith(".mp4")
+    assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+
+
+async def test_declared_oversized_body_is_rejected_before_reading(monkeypatch, api, admin_headers):
+    monkeypatch.setattr(server, "MAX_VIDEO_UPLOAD_BYTES", 1000)
+    read = []
+
+    async def body():
+        read.append(True)
+        yield b""
+
+    response = await api.post(
+        "/api/upload/video", content=body(),
+        headers={**admin_headers, "Content-Type": MULTIPART, "Content-Length": str(10 * 1024 * 1024)},
+    )
+
+    assert response.status_code == 413
+    assert response.json()["detail"] == "File too large. Maximum size is 1000 bytes"
+    assert read == []
+
+
+@pytest.mark.parametrize("file_size", [520 * 1024, 2 * 1024 * 1024])
+async def test_oversized_stream_is_cut_off_and_not_staged(monkeypatch, app, api, admin_headers, file_size):
+    monkeypatch.setattr(server, "MAX_VIDEO_UPLOAD_BYTES", 512 * 1024)
+
+    response = await api.post(
+        "/api/upload/video", content=chunked(form(b"x" * file_size)),
+        headers={**admin_headers, "Content-Type": MULTIPART},
+    )
+
+    assert response.status_code == 413
+    assert response.json()["detail"] == "File too large. Maximum size is 512 KB"
+    assert staged(app) == []
+
+
+async def test_wrong_type_is_rejected_before_the_file_is_written(app, api, admin_headers):
+    response = await api.post(
+        "/api/upload/image", content=form(b"MZ", filename="evil.exe", content_type="application/octet-stream"),
+        headers={**admin_headers, "Content-Type": MULTIPART},
+    )
+
+    assert response.status_code == 400
+    assert staged(app) == []
+
+
+@pytest.mark.parametrize("body,content_type", [
+    (form(b"x" * 100)[:-20], MULTIPART),
+    (b"x" * 100, "application/octet-stream"),
+    (form(b"x").replace(b'name="file"', b'name="other"'), MULTIPART),
+])
+async def test_malformed_uploads_are_rejected(app, api, admin_headers, body, content_type):
+    response = await api.post(
+        "/api/upload/video", content=body, headers={**admin_headers, "Content-Type": content_type}
+    )
+
+    assert response.status_code == 400
+    assert staged(app) == []